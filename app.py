@@ -1,12 +1,21 @@
 import streamlit as st
-from rules import analyze_symptoms, evaluate_followup
+from rules import analyze_symptoms, evaluate_followup, kb_version, IncrementalAnalyzer, KnowledgeBaseWatcher
 import base64
+import copy
+import functools
+import hashlib
+import io
+import json
 import os
+import time
+import uuid
 from datetime import datetime
 
-# ✅ PDF
-from fpdf import FPDF
-import tempfile
+import audit
+import metrics
+from exports import DONE, FAILED, ExportJobs
+from report import CHUNK_CASES, REPORT_DIR, PageCache, generate_pdf_report, prune_files, write_pdf_report
+from storage import CaseStore
 
 # -------------------------
 # Page config
@@ -18,22 +27,118 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+_rerun_start = time.perf_counter()
+
 # -------------------------
-# Background + CSS
+# Metrics exporter
+# Set MEDIBOTX_METRICS_PORT to serve Prometheus text on /metrics
 # -------------------------
-def set_background(image_path):
-    if not os.path.exists(image_path):
-        st.error(f"❌ Background image not found: {image_path}")
-        return
+@st.cache_resource
+def start_metrics_exporter(port):
+    return metrics.start_http_server(port)
+
+if os.environ.get("MEDIBOTX_METRICS_PORT"):
+    start_metrics_exporter(int(os.environ["MEDIBOTX_METRICS_PORT"]))
+
+def timed_section(stage):
+    # fragments rerun on their own, without reaching the app_rerun
+    # metric at the end of the script, so they are timed separately
+    def wrap(section):
+        @functools.wraps(section)
+        def run():
+            with metrics.timer(stage):
+                section()
+        return run
+    return wrap
+
+# -------------------------
+# Knowledge base hot reload
+# One watcher per server process; set MEDIBOTX_KB_FILE to a JSON or
+# compiled KB file to update conditions without a restart.
+# -------------------------
+@st.cache_resource
+def start_kb_watcher(path):
+    return KnowledgeBaseWatcher(path).start()
 
-    with open(image_path, "rb") as f:
-        encoded = base64.b64encode(f.read()).decode()
+if os.environ.get("MEDIBOTX_KB_FILE"):
+    start_kb_watcher(os.environ["MEDIBOTX_KB_FILE"])
 
-    st.markdown(
-        f"""
+# -------------------------
+# Audit log
+# Set MEDIBOTX_AUDIT_LOG to record every analysis and follow-up outcome
+# (written in the background, see audit.py)
+# -------------------------
+@st.cache_resource
+def start_audit_log(path):
+    return audit.configure(path)
+
+if audit.AUDIT_LOG:
+    start_audit_log(audit.AUDIT_LOG)
+
+# -------------------------
+# Background + CSS
+# Image path and optimization are configurable; the optimized image is
+# served from static/ (see .streamlit/config.toml) under a content-hashed
+# name, so browsers cache it instead of receiving it on every rerun.
+# -------------------------
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(APP_DIR, "static")
+BACKGROUND_IMAGE = os.environ.get("MEDIBOTX_BACKGROUND", os.path.join(APP_DIR, "bot1.jpeg"))
+BACKGROUND_MAX_WIDTH = int(os.environ.get("MEDIBOTX_BACKGROUND_MAX_WIDTH", "1920"))
+BACKGROUND_QUALITY = int(os.environ.get("MEDIBOTX_BACKGROUND_QUALITY", "80"))
+
+
+def optimize_image(data, max_width, quality):
+    """Downscale to max_width and recompress as JPEG; keeps the original if not smaller."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return data
+
+    img = Image.open(io.BytesIO(data))
+    if img.width > max_width:
+        img = img.resize((max_width, round(img.height * max_width / img.width)), Image.LANCZOS)
+
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, "JPEG", quality=quality, optimize=True, progressive=True)
+    out = buf.getvalue()
+    return out if len(out) < len(data) else data
+
+
+def publish_static(data, ext):
+    """Write data to static/ under a content-hashed name; returns its URL."""
+    name = f"bg-{hashlib.sha256(data).hexdigest()[:16]}{ext}"
+    path = os.path.join(STATIC_DIR, name)
+    if not os.path.exists(path):
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return f"./app/static/{name}"
+
+
+# ✅ Computed once per server process and shared by every session
+@st.cache_resource(show_spinner=False)
+def build_theme(image_path, max_width, quality, static_serving):
+    error = None
+    background_url = ""
+
+    if not os.path.exists(image_path):
+        error = f"❌ Background image not found: {image_path}"
+    else:
+        with open(image_path, "rb") as f:
+            data = optimize_image(f.read(), max_width, quality)
+        if static_serving:
+            background_url = publish_static(data, ".jpg")
+        else:
+            # no static serving configured: fall back to inlining once-encoded data
+            background_url = "data:image/jpeg;base64," + base64.b64encode(data).decode()
+
+    css = f"""
         <style>
         .stApp {{
-            background-image: url("data:image/jpeg;base64,{encoded}");
+            background-image: url("{background_url}");
             background-size: cover;
             background-attachment: fixed;
             background-position: center;
@@ -123,7 +228,8 @@ def set_background(image_path):
         }}
 
         /* Buttons */
-        div.stButton > button {{
+        div.stButton > button,
+        div[data-testid="stFormSubmitButton"] > button {{
             background-color: #111827 !important;
             border-radius: 14px !important;
             font-weight: 750 !important;
@@ -131,7 +237,8 @@ def set_background(image_path):
             padding: 10px 18px !important;
             width: 100% !important;
         }}
-        div.stButton > button * {{
+        div.stButton > button *,
+        div[data-testid="stFormSubmitButton"] > button * {{
             color: white !important;
         }}
 
@@ -253,79 +360,119 @@ def set_background(image_path):
 
 
         </style>
-        """,
-        unsafe_allow_html=True
+        """
+
+    return {"css": css, "error": error}
+
+
+def set_background(image_path):
+    theme = build_theme(
+        image_path,
+        BACKGROUND_MAX_WIDTH,
+        BACKGROUND_QUALITY,
+        bool(st.get_option("server.enableStaticServing")),
     )
+    if theme["error"]:
+        st.error(theme["error"])
+
+    st.markdown(theme["css"], unsafe_allow_html=True)
 
 # ✅ Apply background image
-set_background(r"C:\Users\alaka\Desktop\MediBotX\bot1.jpeg")
+set_background(BACKGROUND_IMAGE)
 
 # -------------------------
-# PDF Builder
+# PDF Builder (see report.py)
+# Long histories are streamed to a file chunk by chunk, reusing the
+# cached pages of cases already rendered by earlier exports.
 # -------------------------
-def generate_pdf_report(history_list, current_case):
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
+REPORT_STREAM_MIN_CASES = int(os.environ.get("MEDIBOTX_REPORT_STREAM_MIN_CASES", "500"))
+REPORT_FILES = 128
 
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, "MediBotX Health Report", ln=True)
 
-    pdf.set_font("Arial", "", 12)
-    pdf.cell(0, 8, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True)
-    pdf.ln(5)
+@st.cache_resource
+def get_page_cache():
+    return PageCache()
 
-    pdf.set_font("Arial", "B", 13)
-    pdf.cell(0, 8, "Previous Cases:", ln=True)
-    pdf.set_font("Arial", "", 11)
+page_cache = get_page_cache()
 
-    if not history_list:
-        pdf.multi_cell(0, 7, "No previous cases.")
-    else:
-        for i, h in enumerate(history_list, start=1):
-            pdf.set_font("Arial", "B", 11)
-            pdf.multi_cell(0, 7, f"Case {i}")
-            pdf.set_font("Arial", "", 11)
-            pdf.multi_cell(0, 7, f"Symptoms: {h['symptoms']}")
-            pdf.multi_cell(0, 7, f"Condition: {h['condition']}")
-            pdf.multi_cell(0, 7, f"Severity: {h['severity']}")
-            pdf.multi_cell(0, 7, f"Advice: {h['advice']}")
-            pdf.multi_cell(0, 7, f"Time: {h.get('time', '-')}")
-            pdf.ln(3)
-
-    pdf.ln(5)
-    pdf.set_font("Arial", "B", 13)
-    pdf.cell(0, 8, "Current Case:", ln=True)
-    pdf.set_font("Arial", "", 11)
-
-    if current_case is None:
-        pdf.multi_cell(0, 7, "No active case currently.")
-    else:
-        pdf.multi_cell(0, 7, f"Symptoms: {current_case['symptoms']}")
-        pdf.multi_cell(0, 7, f"Condition: {current_case['result']['condition']}")
-        pdf.multi_cell(0, 7, f"Severity: {current_case['result']['severity']}")
-        pdf.multi_cell(0, 7, f"Advice: {current_case['result']['advice']}")
-
-        if current_case.get("final"):
-            pdf.ln(2)
-            pdf.set_font("Arial", "B", 11)
-            pdf.multi_cell(0, 7, "Final Follow-up Result:")
-            pdf.set_font("Arial", "", 11)
-            pdf.multi_cell(0, 7, f"Final Severity: {current_case['final']['final_severity']}")
-            pdf.multi_cell(0, 7, f"Final Advice: {current_case['final']['final_advice']}")
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        pdf.output(tmp.name)
-        tmp_path = tmp.name
-
-    with open(tmp_path, "rb") as f:
-        return f.read()
+def report_content_key(user_id, history_version, current_case):
+    # history is append-only (or cleared), so its store.version() identifies
+    # it; version tuples repeat across users, so the owner is part of the key
+    # (and of the job and file it names)
+    payload = json.dumps([user_id, history_version, current_case], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def build_pdf_report(store, user_id, current_case, key, progress=None):
+    # runs on an export worker thread; history is read only when a job starts
+    with metrics.timer("generate_pdf_report"):
+        total = store.count(user_id)
+        if total < REPORT_STREAM_MIN_CASES:
+            return generate_pdf_report(store.all(user_id), current_case, progress)
+
+        # ✅ returns the file path instead of the bytes
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        path = write_pdf_report(
+            os.path.join(REPORT_DIR, f"{key}.pdf"),
+            store.iter_cases(user_id, CHUNK_CASES),
+            current_case,
+            cache=page_cache,
+            progress=progress,
+            total_chunks=total // CHUNK_CASES,
+        )
+        prune_files(REPORT_DIR, REPORT_FILES)
+        return path
+
+
+# -------------------------
+# Export jobs
+# Reports are built on a shared, bounded thread pool; identical content
+# reuses the queued/running/finished job instead of rebuilding.
+# -------------------------
+EXPORT_WORKERS = int(os.environ.get("MEDIBOTX_EXPORT_WORKERS", "2"))
+EXPORT_WAIT_SECONDS = 0.2
+EXPORT_POLL_SECONDS = 0.5
+
+
+@st.cache_resource
+def get_export_jobs(workers):
+    return ExportJobs(workers)
+
+export_jobs = get_export_jobs(EXPORT_WORKERS)
+
+# -------------------------
+# Case history storage (SQLite)
+# -------------------------
+DB_PATH = os.environ.get("MEDIBOTX_DB", os.path.join(APP_DIR, "medibotx.db"))
+HISTORY_PAGE_SIZE = 10
+
+
+@st.cache_resource
+def get_case_store(path):
+    return CaseStore(path)
+
+store = get_case_store(DB_PATH)
 
 # -------------------------
 # Session state
 # -------------------------
-if "history" not in st.session_state:
-    st.session_state.history = []
+# ✅ History belongs to the logged-in account when st.login is configured
+# in secrets.toml (it then survives reloads and restarts), otherwise to
+# this browser session only. Never to an id from the URL: anyone with the
+# link could read it.
+def account_id():
+    if not st.user.get("is_logged_in"):
+        return None
+    identity = f"{st.user.get('iss')}|{st.user.get('sub')}"
+    return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+if "user_id" not in st.session_state:
+    st.session_state.user_id = account_id() or uuid.uuid4().hex
+
+user_id = st.session_state.user_id
+
+if "history_page" not in st.session_state:
+    st.session_state.history_page = 0
 
 if "current_case" not in st.session_state:
     st.session_state.current_case = None
@@ -333,25 +480,52 @@ if "current_case" not in st.session_state:
 if "followup_answers" not in st.session_state:
     st.session_state.followup_answers = {}
 
+if "live_analyzer" not in st.session_state:
+    st.session_state.live_analyzer = IncrementalAnalyzer()
+
 # -------------------------
 # Sidebar History
 # -------------------------
 st.sidebar.title("📜 Previous Cases")
 
+# auth configured but not logged in: history lasts for this session only
+if "is_logged_in" in st.user and not st.user.is_logged_in:
+    st.sidebar.caption("History is kept for this session only.")
+    st.sidebar.button("🔑 Log in to keep it", on_click=st.login)
+
+def change_history_page(step):
+    st.session_state.history_page = max(0, st.session_state.history_page + step)
+
 if st.sidebar.button("🧹 Clear History"):
-    st.session_state.history = []
+    store.clear(user_id)
+    st.session_state.history_page = 0
 
-if not st.session_state.history:
+# ✅ Only the visible page is queried and rendered
+total_cases = store.count(user_id)
+
+if not total_cases:
     st.sidebar.write("No previous cases.")
 else:
-    for i, item in enumerate(reversed(st.session_state.history), start=1):
-        label = f"Case {len(st.session_state.history) - i + 1}: {item['severity']}"
+    pages = (total_cases + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+    page = min(st.session_state.history_page, pages - 1)
+
+    for item in store.page(user_id, page, HISTORY_PAGE_SIZE):
+        label = f"Case {item['number']}: {item['severity']}"
         with st.sidebar.expander(label):
             st.write("✅ Symptoms:", item["symptoms"])
             st.write("🩺 Condition:", item["condition"])
             st.write("⚠️ Severity:", item["severity"])
             st.write("💡 Advice:", item["advice"])
             st.write("🕒 Time:", item.get("time", "-"))
+            if item.get("final_severity"):
+                st.write("✅ Final Severity:", item["final_severity"])
+                st.write("💡 Final Advice:", item["final_advice"])
+
+    if pages > 1:
+        prev_col, page_col, next_col = st.sidebar.columns([1, 2, 1])
+        prev_col.button("◀", on_click=change_history_page, args=(-1,), disabled=page == 0)
+        page_col.write(f"Page {page + 1} of {pages}")
+        next_col.button("▶", on_click=change_history_page, args=(1,), disabled=page >= pages - 1)
 
 # -------------------------
 # Branding
@@ -372,15 +546,20 @@ st.markdown(
 def handle_new_case(symptoms_text: str):
     if st.session_state.current_case is not None:
         old = st.session_state.current_case
-        st.session_state.history.append({
+        final = old.get("final") or {}
+        store.add_case(user_id, {
             "symptoms": old["symptoms"],
             "condition": old["result"]["condition"],
+            "condition_id": old["result"].get("condition_id"),
             "severity": old["result"]["severity"],
             "advice": old["result"]["advice"],
-            "time": datetime.now().strftime("%H:%M:%S")
+            "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "final_severity": final.get("final_severity"),
+            "final_advice": final.get("final_advice"),
         })
 
     res = analyze_symptoms(symptoms_text)
+    audit.analyze(user_id, symptoms_text, res, kb_version())
     st.session_state.current_case = {
         "symptoms": symptoms_text,
         "result": res,
@@ -403,6 +582,16 @@ with left_col:
         placeholder="Example: fever, headache, stomach pain..."
     )
 
+    # ✅ Suggestion as the text changes; only the edited part is re-scanned.
+    # st.text_area reports its value on Ctrl+Enter or when it loses focus,
+    # not per keystroke, so that is when the suggestion updates.
+    if symptoms.strip():
+        live = st.session_state.live_analyzer.update(symptoms)
+        if live["condition_id"]:
+            st.caption(f"🔎 Looks like: {', '.join(live['possible_conditions'])} ({live['severity']})")
+    else:
+        st.caption("🔎 A suggestion appears after Ctrl+Enter or when you click outside the box.")
+
     b1, b2 = st.columns(2)
     analyze_btn = b1.button("✅ Analyze")
     clear_btn = b2.button("🧹 Clear")
@@ -434,120 +623,179 @@ with right_col:
     st.markdown("</div>", unsafe_allow_html=True)
 
 # -------------------------
-# Output Section
+# PDF Export
 # -------------------------
-case = st.session_state.current_case
+def submit_export():
+    key = report_content_key(user_id, store.version(user_id), st.session_state.current_case)
+    st.session_state.export_job = key
+    return export_jobs.submit(
+        user_id, key, build_pdf_report,
+        store, user_id, copy.deepcopy(st.session_state.current_case), key,
+    )
 
-if case is None:
-    st.info("🩺 Enter symptoms and click **Analyze** or use a quick suggestion.")
-else:
-    result = case["result"]
-    doctor = result.get("doctor", "General Physician")
-    severity = result["severity"]
-    severity_class = severity.lower()
 
+@timed_section("export_section")
+def export_section():
+    # polling reruns follow the job submitted by the last full rerun
+    # (nothing else can change the case meanwhile); resubmit if it was evicted
+    job = export_jobs.get(st.session_state.export_job) if st.session_state.export_polling else None
+    if job is None:
+        job = submit_export()
+
+    # small reports finish within the wait and never show the progress bar
+    state = job.wait(EXPORT_WAIT_SECONDS)
+    if state in (DONE, FAILED) and st.session_state.export_polling:
+        # finished while polling: a full rerun renders it without run_every
+        st.session_state.export_polling = False
+        st.rerun()
+
+    if state == DONE and isinstance(job.result, str):
+        # streamed report on disk
+        with open(job.result, "rb") as f:
+            st.download_button(
+                label="⬇️ Download Report (PDF)",
+                data=f,
+                file_name="MediBotX_Report.pdf",
+                mime="application/pdf"
+            )
+    elif state == DONE:
+        st.download_button(
+            label="⬇️ Download Report (PDF)",
+            data=job.result,
+            file_name="MediBotX_Report.pdf",
+            mime="application/pdf"
+        )
+    elif state == FAILED:
+        st.error(f"❌ Report export failed: {job.error}")
+    else:
+        st.progress(job.progress, text="⏳ Preparing report...")
+
+# -------------------------
+# Output Section
+# Result card, follow-up form and export rerun on their own as a
+# fragment: submitting answers re-executes only this part, not the
+# background, CSS or sidebar history.
+# -------------------------
+@st.fragment
+@timed_section("case_section")
+def case_section():
+    case = st.session_state.current_case
+
+    if case is None:
+        st.info("🩺 Enter symptoms and click **Analyze** or use a quick suggestion.")
+    else:
+        result = case["result"]
+        doctor = result.get("doctor", "General Physician")
+        severity = result["severity"]
+        severity_class = severity.lower()
+
+        st.markdown(
+            f"""
+            <div class="result-card">
+                <b>Condition:</b> {result["condition"]}<br>
+                <b>Severity:</b> <span class="{severity_class}">{severity}</span><br><br>
+                <b>Recommended Specialist:</b> 🩺 <b>{doctor}</b><br><br>
+                <b>Advice:</b> {result["advice"]}
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+
+        if severity == "High":
+            st.progress(100)
+        elif severity == "Medium":
+            st.progress(60)
+        else:
+            st.progress(30)
+
+        if severity == "High":
+            st.error("🚨 This may be a medical emergency.")
+            st.link_button("📞 Call Emergency Help (108)", "tel:108")
+            doc_msg = f"🏥 Doctor Suggestion: <b>Immediate emergency care</b> required. Consult a <b>{doctor}</b> immediately."
+        elif severity == "Medium":
+            doc_msg = f"👨‍⚕️ Doctor Suggestion: Consult a <b>{doctor}</b> within 24–48 hours if symptoms continue."
+        else:
+            doc_msg = f"✅ Doctor Suggestion: Home care is usually enough. If needed, consult a <b>{doctor}</b>."
+
+
+        st.markdown(f"<div class='doctor-card'>{doc_msg}</div>", unsafe_allow_html=True)
+
+        if result.get("possible_conditions"):
+            st.info("✅ Other possible conditions: " + ", ".join(result["possible_conditions"]))
+
+        followups = result.get("follow_up_questions", [])
+        condition_id = result.get("condition_id")
+
+        if followups:
+            st.markdown("### 🧾 Follow-up Questions")
+
+            # ✅ Answers are sent together on submit, not one rerun per click
+            with st.form("followup_form", border=False):
+                for i, fu in enumerate(followups):
+                    q_text = fu.get("q", f"Question {i+1}")
+                    q_id = fu.get("id", q_text)
+                    q_type = fu.get("type", "choice")
+                    key = f"fu_{i}"
+
+                    if q_type == "choice":
+                        st.session_state.followup_answers[q_id] = st.radio(
+                            q_text,
+                            ["Yes", "No", "Not sure"],
+                            key=key,
+                            horizontal=True
+                        )
+
+                    elif q_type == "number":
+                        min_v = int(fu.get("min", 0))
+                        max_v = int(fu.get("max", 100))
+                        default_v = min_v  # ✅ must be >= min_v
+
+                        st.session_state.followup_answers[q_id] = st.number_input(
+                            q_text,
+                            min_value=min_v,
+                            max_value=max_v,
+                            value=default_v,
+                            step=1,
+                            key=key
+                        )
+
+                    else:
+                        st.session_state.followup_answers[q_id] = st.text_input(
+                            q_text,
+                            key=key
+                        )
+
+                submitted = st.form_submit_button("✅ Submit Follow-up")
+
+            if submitted:
+                if condition_id:
+                    final = evaluate_followup(condition_id, st.session_state.followup_answers)
+                    audit.followup(user_id, condition_id, st.session_state.followup_answers, final)
+                    case["final"] = final
+
+        if case.get("final"):
+            st.success(f"✅ Updated Severity: {case['final']['final_severity']}")
+            st.info(f"💡 Final Advice: {case['final']['final_advice']}")
+
+    # Disclaimer
     st.markdown(
-        f"""
-        <div class="result-card">
-            <b>Condition:</b> {result["condition"]}<br>
-            <b>Severity:</b> <span class="{severity_class}">{severity}</span><br><br>
-            <b>Recommended Specialist:</b> 🩺 <b>{doctor}</b><br><br>
-            <b>Advice:</b> {result["advice"]}
+        """
+        <div class="result-card" style="font-size:18px; font-weight:800;">
+        ⚠️ MediBotX does not replace a medical professional.
         </div>
         """,
         unsafe_allow_html=True
     )
 
-    if severity == "High":
-        st.progress(100)
-    elif severity == "Medium":
-        st.progress(60)
-    else:
-        st.progress(30)
-
-    if severity == "High":
-        st.error("🚨 This may be a medical emergency.")
-        st.link_button("📞 Call Emergency Help (108)", "tel:108")
-        doc_msg = f"🏥 Doctor Suggestion: <b>Immediate emergency care</b> required. Consult a <b>{doctor}</b> immediately."
-    elif severity == "Medium":
-        doc_msg = f"👨‍⚕️ Doctor Suggestion: Consult a <b>{doctor}</b> within 24–48 hours if symptoms continue."
-    else:
-        doc_msg = f"✅ Doctor Suggestion: Home care is usually enough. If needed, consult a <b>{doctor}</b>."
-
-
-    st.markdown(f"<div class='doctor-card'>{doc_msg}</div>", unsafe_allow_html=True)
-
-    if result.get("possible_conditions"):
-        st.info("✅ Other possible conditions: " + ", ".join(result["possible_conditions"]))
-
-    followups = result.get("follow_up_questions", [])
-    condition_id = result.get("condition_id")
-
-    if followups:
-        st.markdown("### 🧾 Follow-up Questions")
-
-        for i, fu in enumerate(followups):
-            q_text = fu.get("q", f"Question {i+1}")
-            q_type = fu.get("type", "choice")
-            key = f"fu_{i}"
-
-            if q_type == "choice":
-                st.session_state.followup_answers[q_text] = st.radio(
-                    q_text,
-                    ["Yes", "No", "Not sure"],
-                    key=key,
-                    horizontal=True
-                )
-
-            elif q_type == "number":
-                min_v = int(fu.get("min", 0))
-                max_v = int(fu.get("max", 100))
-                default_v = min_v  # ✅ must be >= min_v
-
-                st.session_state.followup_answers[q_text] = st.number_input(
-                    q_text,
-                    min_value=min_v,
-                    max_value=max_v,
-                    value=default_v,
-                    step=1,
-                    key=key
-                )
-
-            else:
-                st.session_state.followup_answers[q_text] = st.text_input(
-                    q_text,
-                    key=key
-                )
-
-        if st.button("✅ Submit Follow-up"):
-            if condition_id:
-                final = evaluate_followup(condition_id, st.session_state.followup_answers)
-                case["final"] = final
-
-    if case.get("final"):
-        st.success(f"✅ Updated Severity: {case['final']['final_severity']}")
-        st.info(f"💡 Final Advice: {case['final']['final_advice']}")
-
-# Disclaimer
-st.markdown(
-    """
-    <div class="result-card" style="font-size:18px; font-weight:800;">
-    ⚠️ MediBotX does not replace a medical professional.
-    </div>
-    """,
-    unsafe_allow_html=True
-)
+    st.markdown("### 📄 Export Report (PDF)")
 
-# -------------------------
-# PDF Export
-# -------------------------
-st.markdown("### 📄 Export Report (PDF)")
+    # ✅ While a job is running only the export part reruns (polling),
+    # the rest of the page stays usable
+    st.session_state.export_polling = submit_export().wait(EXPORT_WAIT_SECONDS) not in (DONE, FAILED)
+    st.fragment(export_section, run_every=EXPORT_POLL_SECONDS if st.session_state.export_polling else None)()
 
-pdf_bytes = generate_pdf_report(st.session_state.history, st.session_state.current_case)
 
-st.download_button(
-    label="⬇️ Download Report (PDF)",
-    data=pdf_bytes,
-    file_name="MediBotX_Report.pdf",
-    mime="application/pdf"
-)
+case_section()
+
+metrics.inc("medibotx_app_reruns_total")
+metrics.observe("medibotx_stage_seconds", time.perf_counter() - _rerun_start, stage="app_rerun")
@@ -0,0 +1,319 @@
+"""
+Append-only audit log of triage events, for clinical governance:
+every analyze_symptoms result and evaluate_followup outcome served by
+the app or the service.
+
+    MEDIBOTX_AUDIT_LOG=audit.jsonl streamlit run app.py
+    python service.py --audit-log audit.db
+
+Recording only puts a dict on a bounded in-memory queue; a background
+thread encodes and writes whatever has queued up as one group commit
+(one write + one fsync per batch). A full queue makes callers wait for
+the writer instead of dropping events, and close() (also at exit)
+drains the queue before returning.
+- JSONL (one object per line), or SQLite when the path ends in .db
+- size-based rotation: the current file is renamed with a timestamp and
+  a new one started; old files are kept unless backups is set
+- fsync policy: "always" (every batch), "interval" (at most every
+  fsync_interval seconds) or "never" (left to the OS)
+"""
+import atexit
+import glob
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import warnings
+from datetime import datetime
+
+import metrics
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+AUDIT_LOG = os.environ.get("MEDIBOTX_AUDIT_LOG")
+FSYNC = os.environ.get("MEDIBOTX_AUDIT_FSYNC", "interval")
+MAX_BYTES = int(os.environ.get("MEDIBOTX_AUDIT_MAX_BYTES", str(100 * 2 ** 20)))
+BACKUPS = int(os.environ.get("MEDIBOTX_AUDIT_BACKUPS", "0"))  # 0 keeps every rotated file
+
+_STOP = object()
+
+
+# -------------------------
+# Sinks
+# -------------------------
+class _JsonlSink:
+    # the fsync policy is applied by AuditLog, which decides when to call sync()
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def write(self, entries: list):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.write(b"".join(
+            json.dumps(e, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+            for e in entries
+        ))
+        self._file.flush()
+
+    def sync(self):
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+
+    def size(self) -> int:
+        if self._file is not None:
+            return self._file.tell()
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _SqliteSink:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts REAL NOT NULL,
+        event TEXT NOT NULL,
+        session TEXT,
+        data TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path: str, fsync: str):
+        self.path = path
+        # "always": every commit is synced; otherwise sync() checkpoints
+        self.synchronous = {"always": "FULL", "interval": "NORMAL", "never": "OFF"}[fsync]
+        self._conn = None
+
+    def write(self, entries: list):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._conn.executescript(self.SCHEMA)
+        rows = []
+        for e in entries:
+            data = {k: v for k, v in e.items() if k not in ("ts", "event", "session")}
+            rows.append((e["ts"], e["event"], e.get("session"),
+                         json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)))
+        with self._conn:
+            self._conn.executemany("INSERT INTO events (ts, event, session, data) VALUES (?, ?, ?, ?)", rows)
+
+    def sync(self):
+        if self._conn is not None:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def size(self) -> int:
+        return sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def rotate(path: str, backups: int = 0):
+    """Rename path to a timestamped name next to it; keep the newest `backups` (0: all)."""
+    root, ext = os.path.splitext(path)
+    if os.path.exists(path):
+        os.replace(path, f"{root}-{datetime.now():%Y%m%dT%H%M%S%f}{ext}")
+    if backups:
+        # the timestamp sorts by age
+        old = sorted(glob.glob(f"{glob.escape(root)}-*{ext}"))
+        for name in old[:-backups]:
+            os.remove(name)
+
+
+# -------------------------
+# Log
+# -------------------------
+class AuditLog:
+    """
+    Bounded queue plus a writer thread.
+    - record(entry) enqueues (microseconds); blocks only when the queue is full
+    - the writer commits up to batch_size queued entries per write
+    - flush() waits until everything recorded so far is written
+    """
+
+    def __init__(self, path: str, fsync: str = FSYNC, max_bytes: int = MAX_BYTES, backups: int = BACKUPS,
+                 queue_size: int = 10000, batch_size: int = 1000, fsync_interval: float = 1.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}")
+        self.path = path
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+
+        self._sink = _SqliteSink(path, fsync) if path.endswith(".db") else _JsonlSink(path)
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()          # the sink
+        self._close_lock = threading.Lock()    # _closed, and enqueueing before _STOP
+        self._dirty = False
+        self._synced_at = time.monotonic()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, entry: dict):
+        with self._close_lock:
+            if not self._closed:
+                try:
+                    self._queue.put_nowait(entry)
+                except queue.Full:
+                    # burst larger than the queue: wait for the writer
+                    metrics.inc("medibotx_audit_backpressure_total")
+                    self._queue.put(entry)
+                return
+
+        # after shutdown: write it directly rather than lose it
+        warnings.warn(f"Audit event recorded after the log was closed; writing it directly to {self.path}")
+        self._write([entry])
+        with self._lock:
+            self._sync_locked()
+            self._sink.close()
+
+    def flush(self):
+        self._queue.join()
+        with self._lock:
+            self._sync_locked()
+
+    def _run(self):
+        stopping = False
+        while not stopping or not self._queue.empty():
+            try:
+                batch = [self._queue.get(timeout=self.fsync_interval)]
+            except queue.Empty:
+                # idle: sync what the interval policy left unsynced
+                with self._lock:
+                    if self._dirty and self.fsync == "interval":
+                        self._sync_locked()
+                continue
+            # group commit: everything already queued goes in the same write
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            entries = [e for e in batch if e is not _STOP]
+            stopping = stopping or len(entries) < len(batch)
+            if entries:
+                self._write_retrying(entries)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_retrying(self, entries: list, attempts: int = 3):
+        # a failed write is retried (callers wait meanwhile); only a
+        # persistent error loses the batch, and that is counted
+        for attempt in range(attempts):
+            try:
+                self._write(entries)
+                return
+            except Exception as e:
+                warnings.warn(f"Audit log write failed (attempt {attempt + 1} of {attempts}): "
+                              f"{type(e).__name__}: {e}")
+                if attempt + 1 < attempts:
+                    time.sleep(self.fsync_interval)
+        metrics.inc("medibotx_audit_events_total", len(entries), outcome="failed")
+
+    def _write(self, entries: list):
+        with self._lock:
+            if self._sink.size() >= self.max_bytes:
+                self._sync_locked()
+                self._sink.close()
+                rotate(self.path, self.backups)
+                metrics.inc("medibotx_audit_rotations_total")
+
+            self._sink.write(entries)
+            self._dirty = True
+            if self.fsync == "always" or (
+                self.fsync == "interval" and time.monotonic() - self._synced_at >= self.fsync_interval
+            ):
+                self._sync_locked()
+        metrics.inc("medibotx_audit_events_total", len(entries), outcome="written")
+
+    def _sync_locked(self):
+        if self._dirty and self.fsync != "never":
+            self._sink.sync()
+        self._dirty = False
+        self._synced_at = time.monotonic()
+
+    def close(self, timeout: float = 30.0):
+        """Drain the queue, sync and close the file."""
+        with self._close_lock:
+            if self._closed:
+                return
+            # every record enqueued so far is ahead of _STOP; later ones
+            # are written directly (see record)
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            warnings.warn(f"Audit log writer did not finish within {timeout}s; "
+                          f"about {self._queue.qsize()} events are not written yet")
+        with self._lock:
+            self._sync_locked()
+            self._sink.close()
+
+
+# -------------------------
+# Events
+# Nothing is recorded until configure() is called.
+# -------------------------
+_log = None
+
+
+def configure(path: str, **options) -> AuditLog:
+    """Start the process-wide audit log (replacing any previous one)."""
+    global _log
+    previous, _log = _log, AuditLog(path, **options)
+    if previous is not None:
+        previous.close()
+    return _log
+
+
+def get_log():
+    return _log
+
+
+def record(event: str, session: str = None, **data):
+    log = _log
+    if log is not None:
+        log.record({"ts": time.time(), "event": event, "session": session, **data})
+
+
+def analyze(session: str, symptoms: str, result: dict, kb_version: int = None):
+    """Record an analyze_symptoms result."""
+    record(
+        "analyze", session,
+        symptoms=symptoms,
+        condition_id=result.get("condition_id"),
+        severity=result.get("severity"),
+        possible_conditions=result.get("possible_conditions"),
+        kb_version=kb_version,
+    )
+
+
+def followup(session: str, condition_id: str, answers: dict, final: dict):
+    """Record an evaluate_followup outcome."""
+    record(
+        "followup", session,
+        condition_id=condition_id,
+        answers=dict(answers),
+        final_severity=final.get("final_severity"),
+        final_advice=final.get("final_advice"),
+    )
+
+
+def close():
+    if _log is not None:
+        _log.close()
@@ -0,0 +1,279 @@
+"""
+Benchmarks for the rules engine on synthetic knowledge bases.
+
+    python bench.py run --sizes 100,1000,10000 -o after.json
+    python bench.py compare before.json after.json
+
+Each run reports throughput and p50/p99 latency per
+(KB size, benchmark, input corpus) and can be saved as JSON; compare
+flags anything slower than --threshold and exits non-zero.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+
+import rules
+
+# -------------------------
+# Synthetic knowledge base
+# -------------------------
+BODY_PARTS = [
+    "chest", "head", "stomach", "back", "leg", "arm", "ear", "eye", "throat",
+    "knee", "shoulder", "neck", "foot", "hand", "hip", "jaw", "tooth", "skin",
+    "lower back", "upper abdomen", "left side", "right side", "calf", "wrist",
+]
+SYMPTOMS = [
+    "pain", "ache", "swelling", "itching", "burning", "cramps", "numbness",
+    "stiffness", "weakness", "bleeding", "rash", "tightness", "pressure",
+]
+SINGLE_WORDS = [
+    "fever", "cough", "nausea", "vomiting", "diarrhea", "fatigue", "dizziness",
+    "headache", "chills", "sweating", "bloating", "insomnia", "seizure",
+    "fainting", "wheezing", "sneezing", "constipation", "palpitations",
+]
+FILLER = [
+    "i", "have", "had", "since", "yesterday", "and", "a", "lot", "of", "my",
+    "the", "very", "bad", "today", "after", "eating", "morning", "night",
+    "feel", "some", "little", "two", "days", "it", "is", "getting", "worse",
+]
+SEVERITIES = ["High", "Medium", "Low"]
+
+
+def synthetic_conditions(n: int, seed: int = 0) -> list:
+    """n conditions with a realistic mix of phrases, single words and follow-ups."""
+    rnd = random.Random(seed)
+    conditions = []
+    for i in range(n):
+        keywords = set()
+        for _ in range(rnd.randint(2, 8)):
+            if rnd.random() < 0.6:
+                keywords.add(f"{rnd.choice(BODY_PARTS)} {rnd.choice(SYMPTOMS)}")
+            elif rnd.random() < 0.5:
+                keywords.add(f"{rnd.choice(SYMPTOMS)} in {rnd.choice(BODY_PARTS)}")
+            else:
+                keywords.add(rnd.choice(SINGLE_WORDS))
+        # a unique word per condition, as real KBs have specific terms
+        keywords.add(f"term{i}")
+
+        conditions.append({
+            "id": f"cond{i}",
+            "condition": f"Synthetic Condition {i}",
+            "severity": rnd.choice(SEVERITIES),
+            "doctor": "General Physician",
+            "keywords": sorted(keywords),
+            "advice": "Synthetic advice.",
+            "follow_up": [
+                {"id": "worse", "q": "Is it getting worse?", "type": "choice"},
+                {"id": "days", "q": "How many days?", "type": "number", "min": 0, "max": 30},
+            ],
+            "decision_table": {
+                "rules": [
+                    {"any_yes": ["worse"], "severity": "High", "advice": "Synthetic escalation."},
+                    {"number": "days", "at_least": 3, "severity": "Medium", "advice": "Synthetic follow-up."},
+                ],
+                "otherwise": {"severity": "Low", "advice": "Synthetic advice."},
+            },
+        })
+    return conditions
+
+
+def synthetic_corpus(n_words: int, count: int, seed: int = 0) -> list:
+    """Symptom texts of about n_words words, mixing KB terms and filler."""
+    rnd = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        words = []
+        while len(words) < n_words:
+            r = rnd.random()
+            if r < 0.2:
+                words += f"{rnd.choice(BODY_PARTS)} {rnd.choice(SYMPTOMS)}".split()
+            elif r < 0.35:
+                words.append(rnd.choice(SINGLE_WORDS))
+            else:
+                words.append(rnd.choice(FILLER))
+        text = " ".join(words[:n_words])
+        texts.append(text.capitalize() + rnd.choice([".", "!", "", "..."]))
+    return texts
+
+
+CORPORA = {"short": 4, "medium": 25, "long": 200}
+
+# -------------------------
+# Timing
+# -------------------------
+def _percentile(sorted_ns: list, p: float) -> float:
+    idx = min(len(sorted_ns) - 1, int(round(p / 100 * (len(sorted_ns) - 1))))
+    return sorted_ns[idx]
+
+
+def measure(fn, args_list: list) -> dict:
+    """Call fn(*args) for each args tuple; latency percentiles and throughput."""
+    if args_list:
+        fn(*args_list[0])  # warm-up: lazy imports and first-use structures
+
+    timings = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for args in args_list:
+        t0 = clock()
+        fn(*args)
+        timings.append(clock() - t0)
+    total = clock() - start
+
+    timings.sort()
+    return {
+        "calls": len(timings),
+        "ops_per_s": len(timings) / (total / 1e9) if total else 0.0,
+        "p50_us": _percentile(timings, 50) / 1e3,
+        "p99_us": _percentile(timings, 99) / 1e3,
+    }
+
+
+def _timed(fn, *args) -> float:
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+
+# -------------------------
+# Runs
+# -------------------------
+def run_size(n_conditions: int, calls: int, seed: int, batch: bool, verify: bool) -> list:
+    conditions = synthetic_conditions(n_conditions, seed)
+    results = []
+
+    def add(bench, corpus, stats):
+        results.append({"kb_size": n_conditions, "bench": bench, "corpus": corpus, **stats})
+        print(f"{n_conditions:>7} {bench:<22} {corpus:<7} "
+              f"{stats['ops_per_s']:>12.1f}/s  p50 {stats['p50_us']:>9.1f}us  p99 {stats['p99_us']:>9.1f}us")
+
+    build_s = _timed(rules.load_conditions, conditions)
+    add("kb_load", "-", {"calls": 1, "ops_per_s": 1 / build_s, "p50_us": build_s * 1e6, "p99_us": build_s * 1e6})
+
+    ids = [c["id"] for c in conditions]
+    rnd = random.Random(seed)
+    for corpus, n_words in CORPORA.items():
+        texts = synthetic_corpus(n_words, calls, seed)
+        cleaned = [rules.preprocess(t) for t in texts]
+
+        add("preprocess", corpus, measure(rules.preprocess, [(t,) for t in texts]))
+        add("keyword_match_score", corpus, measure(
+            rules.keyword_match_score,
+            [(t, conditions[rnd.randrange(n_conditions)]["keywords"]) for t in cleaned],
+        ))
+        add("analyze_symptoms", corpus, measure(rules.analyze_symptoms, [(t,) for t in texts]))
+
+        if batch:
+            chunk = 1000
+            chunks = [(texts[i:i + chunk],) for i in range(0, len(texts), chunk)]
+            stats = measure(rules.analyze_symptoms_batch, chunks)
+            # report rows/s rather than chunks/s
+            stats["ops_per_s"] *= len(texts) / max(len(chunks), 1)
+            add("analyze_symptoms_batch", corpus, stats)
+
+        if verify:
+            automaton = rules._KB["automaton"]
+            for text in cleaned[:200]:
+                expected = {}
+                for idx, item in enumerate(conditions):
+                    score = rules.keyword_match_score(text, item["keywords"])
+                    if score:
+                        expected[idx] = score
+                if automaton.scores(text) != expected:
+                    raise AssertionError(f"scorer mismatch for {text!r}")
+
+    answers = [
+        (rnd.choice(ids), {"worse": rnd.choice(["Yes", "No", "Not sure"]), "days": rnd.randint(0, 10)})
+        for _ in range(calls)
+    ]
+    add("evaluate_followup", "-", measure(rules.evaluate_followup, answers))
+    return results
+
+
+def cmd_run(args) -> int:
+    # measure the matching path, not cache hits
+    rules.RESULT_CACHE.resize(0)
+    original = rules.CONDITIONS
+
+    results = []
+    try:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            results += run_size(size, args.calls, args.seed, args.batch, args.verify)
+    finally:
+        rules.load_conditions(original)
+
+    report = {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": args.sizes,
+            "calls": args.calls,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved {args.output}")
+    return 0
+
+
+def cmd_compare(args) -> int:
+    with open(args.before, encoding="utf-8") as f:
+        before = {(r["kb_size"], r["bench"], r["corpus"]): r for r in json.load(f)["results"]}
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'kb':>7} {'bench':<22} {'corpus':<7} {'p50':>8} {'p99':>8} {'ops/s':>8}")
+    for r in after:
+        old = before.get((r["kb_size"], r["bench"], r["corpus"]))
+        if old is None:
+            continue
+
+        def change(key):
+            return (r[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+
+        p50, p99, ops = change("p50_us"), change("p99_us"), change("ops_per_s")
+        flag = ""
+        if p50 > args.threshold or ops < -args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{r['kb_size']:>7} {r['bench']:<22} {r['corpus']:<7} "
+              f"{p50:>+7.1f}% {p99:>+7.1f}% {ops:>+7.1f}%{flag}")
+
+    print(f"{regressions} regression(s) over {args.threshold}%")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="MediBotX rules engine benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="run benchmarks on synthetic knowledge bases")
+    p.add_argument("--sizes", default="100,1000,10000", help="comma-separated KB sizes (conditions)")
+    p.add_argument("--calls", type=int, default=2000, help="calls per benchmark and corpus")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--batch", action="store_true", help="also benchmark analyze_symptoms_batch")
+    p.add_argument("--verify", action="store_true", help="check the automaton against keyword_match_score")
+    p.add_argument("-o", "--output", help="save results as JSON")
+
+    p = sub.add_parser("compare", help="compare two saved runs")
+    p.add_argument("before")
+    p.add_argument("after")
+    p.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return cmd_run(args)
+    return cmd_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Background report export jobs.
+
+Jobs run on a small shared thread pool so building a large report never
+blocks a Streamlit rerun. Jobs are keyed by report content: asking for
+the same content again returns the job that is already queued, running
+or finished. Each session has at most one queued job, so a burst of
+exports from one user cannot fill the pool ahead of everyone else.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import metrics
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class ExportJob:
+    def __init__(self, key: str):
+        self.key = key
+        self.state = PENDING
+        self.done_steps = 0
+        self.total_steps = 0
+        self.result = None
+        self.error = None
+        self.future = None
+
+    @property
+    def progress(self) -> float:
+        if self.state == DONE:
+            return 1.0
+        return self.done_steps / self.total_steps if self.total_steps else 0.0
+
+    def wait(self, timeout: float) -> str:
+        """Wait up to timeout seconds for the job to finish; returns its state."""
+        wait([self.future], timeout)
+        return self.state
+
+    def report(self, done: int, total: int):
+        """Progress callback handed to the export function."""
+        self.done_steps, self.total_steps = done, total
+
+
+class ExportJobs:
+    """
+    Bounded executor plus a job table.
+    - submit(session, key, fn, *args) calls fn(*args, progress=job.report)
+    - finished jobs stay available (LRU, max_finished) for repeat downloads
+    """
+
+    def __init__(self, workers: int = 2, max_finished: int = 64):
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        self._jobs = OrderedDict()   # key -> ExportJob
+        self._queued = {}            # session -> key of its queued job
+        self._lock = threading.Lock()
+
+    def submit(self, session: str, key: str, fn, *args) -> ExportJob:
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.state != FAILED:
+                self._jobs.move_to_end(key)
+                metrics.inc("medibotx_export_jobs_total", outcome="reused")
+                return job
+
+            # a newer request from the same session replaces its queued one
+            previous = self._jobs.get(self._queued.get(session))
+            if previous is not None and previous.state == PENDING and previous.future.cancel():
+                del self._jobs[previous.key]
+
+            job = self._jobs[key] = ExportJob(key)
+            self._queued[session] = key
+            job.future = self._executor.submit(self._run, job, fn, args)
+            metrics.inc("medibotx_export_jobs_total", outcome="submitted")
+            self._evict_locked()
+            return job
+
+    def get(self, key: str):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def _run(self, job: ExportJob, fn, args):
+        job.state = RUNNING
+        try:
+            with metrics.timer("export_job"):
+                job.result = fn(*args, progress=job.report)
+            job.state = DONE
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.state = FAILED
+            metrics.inc("medibotx_export_jobs_total", outcome="failed")
+
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self):
+        finished = [k for k, j in self._jobs.items() if j.state in (DONE, FAILED)]
+        for key in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[key]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
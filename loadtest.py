@@ -0,0 +1,366 @@
+"""
+Load test for app.py: concurrent sessions driven headlessly with
+Streamlit's AppTest.
+
+    python loadtest.py run --sessions 20 --steps 30 --history 300 -o after.json
+    python loadtest.py compare before.json after.json
+
+Each session is a thread with its own AppTest (its own session state and
+history id); the sessions of one process share the app's cached resources as
+sessions of one server do, and --processes runs several such servers.
+Sessions start with --history stored cases and then run a random mix of
+interactions: typing, analyzing free text, quick suggestion buttons,
+answering follow-ups and paging the history.
+Reported:
+- rerun latency p50/p95/p99 per interaction, and the script run time
+  alone (run_p50_ms)
+- throughput (reruns per second over all sessions)
+- memory per session (process RSS growth / sessions)
+
+AppTest installs a process-wide mock runtime for each run, so the reruns
+of one process run one at a time; latency includes waiting for the
+others, as on a server whose sessions compete for the GIL. AppTest also
+always reruns the whole script, so interactions that only rerun a
+fragment in the browser are measured as full reruns (an upper bound).
+The case database and report files go to a temporary directory unless
+MEDIBOTX_DB / MEDIBOTX_REPORT_DIR are set.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+from bench import FILLER, _percentile
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, "app.py")
+
+QUICK_BUTTONS = ["🤒 Fever", "🤧 Cold", "💔 Chest Pain", "🤢 Stomach Pain", "😷 Breathing Issue"]
+
+# interaction -> relative frequency
+MIX = {
+    "type": 15,
+    "analyze": 30,
+    "quick": 15,
+    "followup": 30,
+    "history_page": 10,
+}
+
+
+# -------------------------
+# Session scripts
+# -------------------------
+def symptom_text(rnd: random.Random, keywords: list) -> str:
+    """A free-text description mixing KB keywords and filler words."""
+    words = []
+    for _ in range(rnd.randint(1, 3)):
+        words += rnd.sample(FILLER, rnd.randint(1, 4))
+        words.append(rnd.choice(keywords))
+    return " ".join(words).capitalize()
+
+
+def _button(at, label: str):
+    for b in at.button:
+        if b.label == label:
+            return b
+    return None
+
+
+def _type(at, rnd, keywords):
+    at.text_area[0].input(symptom_text(rnd, keywords))
+    return "type"
+
+
+def _analyze(at, rnd, keywords):
+    if not at.text_area[0].value:
+        at.text_area[0].input(symptom_text(rnd, keywords))
+    _button(at, "✅ Analyze").click()
+    return "analyze"
+
+
+def _quick(at, rnd, keywords):
+    _button(at, rnd.choice(QUICK_BUTTONS)).click()
+    return "quick"
+
+
+def _followup(at, rnd, keywords):
+    submit = _button(at, "✅ Submit Follow-up")
+    if submit is None:
+        # no case with follow-ups yet
+        return _quick(at, rnd, keywords)
+    for radio in at.radio:
+        radio.set_value(rnd.choice(["Yes", "No", "Not sure"]))
+    for number in at.number_input:
+        number.set_value(rnd.randint(int(number.min), int(number.max)))
+    for text in at.text_input:
+        text.input(rnd.choice(FILLER))
+    submit.click()
+    return "followup"
+
+
+def _history_page(at, rnd, keywords):
+    forward = _button(at, "▶")
+    if forward is None or forward.disabled:
+        back = _button(at, "◀")
+        if back is None or back.disabled:
+            return _analyze(at, rnd, keywords)
+        back.click()
+    else:
+        forward.click()
+    return "history_page"
+
+
+INTERACTIONS = {
+    "type": _type,
+    "analyze": _analyze,
+    "quick": _quick,
+    "followup": _followup,
+    "history_page": _history_page,
+}
+
+
+def seed_history(db_path: str, session_ids: list, cases: int, keywords: list, seed: int):
+    """Store `cases` past cases for each session, as if typed over time."""
+    import rules
+    from storage import CaseStore
+
+    rnd = random.Random(seed)
+    store = CaseStore(db_path)
+    try:
+        for sid in session_ids:
+            for _ in range(cases):
+                text = symptom_text(rnd, keywords)
+                res = rules.analyze_symptoms(text)
+                store.add_case(sid, {
+                    "symptoms": text,
+                    "condition": res["condition"],
+                    "condition_id": res["condition_id"],
+                    "severity": res["severity"],
+                    "advice": res["advice"],
+                    "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                })
+        store.flush()
+    finally:
+        store.close()
+
+
+def run_session(sid: str, steps: int, seed: int, keywords: list, timeout: float,
+                start: threading.Barrier, lock: threading.Lock):
+    """Run one session; returns (AppTest, [(interaction, seconds, run seconds, error or None)])."""
+    from streamlit.testing.v1 import AppTest
+
+    rnd = random.Random(seed)
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.session_state["user_id"] = sid
+    names = list(MIX)
+    weights = [MIX[n] for n in names]
+
+    start.wait()
+    timings = []
+    name = "load"
+    for step in range(steps + 1):
+        if step:
+            name = INTERACTIONS[rnd.choices(names, weights)[0]](at, rnd, keywords)
+        t0 = time.perf_counter()
+        with lock:
+            t1 = time.perf_counter()
+            try:
+                at.run()
+                error = at.exception[0].message if len(at.exception) else None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            t2 = time.perf_counter()
+        timings.append((name, t2 - t0, t2 - t1, error))
+        if error:
+            break
+    return at, timings
+
+
+# -------------------------
+# Measurements
+# -------------------------
+def rss_bytes() -> int:
+    """Current resident set size of this process (peak where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def summarize(timings: list) -> dict:
+    by_name = {"all": timings}
+    for t in timings:
+        by_name.setdefault(t[0], []).append(t)
+
+    results = {}
+    for name in ["load", *MIX, "all"]:
+        if name not in by_name:
+            continue
+        ms = sorted(t[1] * 1e3 for t in by_name[name])
+        run_ms = sorted(t[2] * 1e3 for t in by_name[name])
+        results[name] = {
+            "reruns": len(ms),
+            "p50_ms": _percentile(ms, 50),
+            "p95_ms": _percentile(ms, 95),
+            "p99_ms": _percentile(ms, 99),
+            "run_p50_ms": _percentile(run_ms, 50),
+        }
+    return results
+
+
+def run_server(session_ids: list, steps: int, seed: int, keywords: list, timeout: float) -> dict:
+    """Run sessions concurrently in this process, like one app server."""
+    lock = threading.Lock()
+
+    # warm-up session: imports, cached resources, background theme
+    run_session(f"{session_ids[0]}-warmup", 0, seed, keywords, timeout, threading.Barrier(1), lock)
+    rss_before = rss_bytes()
+
+    start = threading.Barrier(len(session_ids))
+    with ThreadPoolExecutor(max_workers=len(session_ids)) as pool:
+        futures = [
+            pool.submit(run_session, sid, steps, seed + i, keywords, timeout, start, lock)
+            for i, sid in enumerate(session_ids)
+        ]
+        sessions = [f.result() for f in futures]
+
+    # sessions stay referenced until memory is measured
+    rss_after = rss_bytes()
+    return {
+        "timings": [t for _, session in sessions for t in session],
+        "rss_growth": max(0, rss_after - rss_before),
+        "rss": rss_after,
+    }
+
+
+def cmd_run(args) -> int:
+    tmp = tempfile.mkdtemp(prefix="medibotx-load-")
+    os.environ.setdefault("MEDIBOTX_DB", os.path.join(tmp, "load.db"))
+    os.environ.setdefault("MEDIBOTX_REPORT_DIR", os.path.join(tmp, "reports"))
+
+    import rules
+    keywords = sorted({k for item in rules.CONDITIONS for k in item["keywords"]})
+    session_ids = [f"load-{args.seed}-{i}" for i in range(args.sessions)]
+    if args.history:
+        seed_history(os.environ["MEDIBOTX_DB"], session_ids, args.history, keywords, args.seed)
+
+    servers = [session_ids[i::args.processes] for i in range(args.processes)]
+    servers = [ids for ids in servers if ids]
+    t0 = time.perf_counter()
+    if len(servers) == 1:
+        results = [run_server(servers[0], args.steps, args.seed, keywords, args.timeout)]
+    else:
+        with ProcessPoolExecutor(max_workers=len(servers)) as pool:
+            futures = [
+                pool.submit(run_server, ids, args.steps, args.seed + i * args.sessions, keywords, args.timeout)
+                for i, ids in enumerate(servers)
+            ]
+            results = [f.result() for f in futures]
+    wall = time.perf_counter() - t0
+
+    timings = [t for r in results for t in r["timings"]]
+    errors = [t[3] for t in timings if t[3]]
+    report = {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sessions": args.sessions,
+            "steps": args.steps,
+            "history": args.history,
+            "processes": len(servers),
+            "seed": args.seed,
+        },
+        "throughput_rps": len(timings) / wall if wall else 0.0,
+        "memory_per_session_mb": sum(r["rss_growth"] for r in results) / args.sessions / 2 ** 20,
+        "rss_mb": sum(r["rss"] for r in results) / 2 ** 20,
+        "errors": len(errors),
+        "interactions": summarize(timings),
+    }
+
+    print(f"{args.sessions} sessions x {args.steps} steps, {args.history} cases each: "
+          f"{report['throughput_rps']:.1f} reruns/s, {report['memory_per_session_mb']:.2f} MB/session, "
+          f"{len(errors)} error(s)")
+    print(f"{'interaction':<13} {'reruns':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'run p50':>8}")
+    for name, r in report["interactions"].items():
+        print(f"{name:<13} {r['reruns']:>7} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['run_p50_ms']:>8.1f}")
+    for error in sorted(set(errors))[:5]:
+        print(f"error: {error}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved {args.output}")
+    return 1 if errors else 0
+
+
+def cmd_compare(args) -> int:
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+
+    def change(new, old):
+        return (new - old) / old * 100 if old else 0.0
+
+    regressions = 0
+    print(f"{'interaction':<13} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, r in after["interactions"].items():
+        old = before["interactions"].get(name)
+        if old is None:
+            continue
+        p50, p95, p99 = (change(r[k], old[k]) for k in ("p50_ms", "p95_ms", "p99_ms"))
+        flag = ""
+        if p95 > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{name:<13} {p50:>+7.1f}% {p95:>+7.1f}% {p99:>+7.1f}%{flag}")
+
+    rps = change(after["throughput_rps"], before["throughput_rps"])
+    mem = change(after["memory_per_session_mb"], before["memory_per_session_mb"])
+    flag = ""
+    if rps < -args.threshold:
+        flag = "  REGRESSION"
+        regressions += 1
+    print(f"throughput {rps:+.1f}%{flag}, memory per session {mem:+.1f}%")
+
+    print(f"{regressions} regression(s) over {args.threshold}%")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="MediBotX app load test")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="run concurrent sessions against app.py")
+    p.add_argument("--sessions", type=int, default=10, help="concurrent sessions")
+    p.add_argument("--processes", type=int, default=1, help="app server processes sharing the sessions")
+    p.add_argument("--steps", type=int, default=20, help="interactions per session")
+    p.add_argument("--history", type=int, default=200, help="stored cases per session before the run")
+    p.add_argument("--timeout", type=float, default=60.0, help="seconds allowed per rerun")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("-o", "--output", help="save results as JSON")
+
+    p = sub.add_parser("compare", help="compare two saved runs")
+    p.add_argument("before")
+    p.add_argument("after")
+    p.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        return cmd_run(args)
+    return cmd_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Metrics for the triage pipeline: counters and latency histograms,
+exported in Prometheus text format.
+
+The active collector is pluggable (set_collector); the default keeps
+everything in memory and can be scraped locally with start_http_server.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# seconds
+DEFAULT_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005,
+    0.01, 0.05, 0.1, 0.5, 1.0, 5.0,
+)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+# -------------------------
+# Collectors
+# -------------------------
+class NullCollector:
+    """Drops everything; use to switch metrics off."""
+
+    def inc(self, name: str, value: float = 1, **labels):
+        pass
+
+    def observe(self, name: str, value: float, **labels):
+        pass
+
+    def render(self) -> str:
+        return ""
+
+
+class InMemoryCollector:
+    """Thread-safe counters and histograms, rendered as Prometheus text."""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}    # name -> {label key: value}
+        self._histograms = {}  # name -> {label key: [bucket counts..., sum, count]}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            h = series.get(key)
+            if h is None:
+                h = series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    h[i] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    def value(self, name: str, **labels) -> float:
+        """Current value of a counter series (0 if never incremented)."""
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+
+            for name in sorted(self._histograms):
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in sorted(self._histograms[name].items()):
+                    for bound, count in zip(self.buckets, h):
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', repr(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, (('le', '+Inf'),))} {h[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h[-2]}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h[-1]}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+_collector = InMemoryCollector()
+
+
+def get_collector():
+    return _collector
+
+
+def set_collector(collector):
+    """Route all metrics to collector (anything with inc/observe/render)."""
+    global _collector
+    _collector = collector
+
+
+def inc(name: str, value: float = 1, **labels):
+    _collector.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    _collector.observe(name, value, **labels)
+
+
+@contextmanager
+def timer(stage: str):
+    """Record the duration of a pipeline stage in medibotx_stage_seconds."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _collector.observe("medibotx_stage_seconds", time.perf_counter() - t0, stage=stage)
+
+
+# -------------------------
+# Local exporter
+# -------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = _collector.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int = 9108, addr: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread. Call server.shutdown() to stop."""
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,253 @@
+"""
+Optional model-based ranking backend for analyze_symptoms.
+
+    python ranker.py train --cases reviewed.jsonl -o ranker.json
+    MEDIBOTX_RANKER=model streamlit run app.py
+
+A linear classifier (logistic regression) over hashed word and bigram
+features, trained from the knowledge-base keywords plus labeled cases
+(CSV/JSONL with symptoms and condition_id, e.g. reviewed triage output,
+or a medibotx.db case history). Features use the hashing trick, like
+HashingVectorizer (with crc32, which is cheaper per feature than
+murmurhash from Python), so nothing but the weights has to be stored.
+
+The model is plain data, like the compiled KB artifact: metadata and
+intercepts in JSON (ranker.json) and the weight matrix in a .npy file
+next to it (ranker.npy), loaded with allow_pickle=False so a model file
+cannot run code. The weights are memory-mapped on load and shared by
+every worker process. Inference is one sparse x dense product per batch;
+rules.py falls back to the keyword rules when the model is unsure.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sqlite3
+import sys
+import zlib
+
+import numpy as np
+from scipy import sparse
+from sklearn.linear_model import LogisticRegression
+
+import rules
+
+MODEL_FORMAT = 2
+N_FEATURES = 2 ** 16
+MIN_CONFIDENCE = 0.5   # best class probability needed to answer
+MIN_SHARE = 0.15       # further classes listed as possible conditions
+
+
+# -------------------------
+# Features
+# -------------------------
+def features(tokens: list) -> list:
+    """Words and word bigrams of a token list."""
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def hashed(tokens: list, n_features: int = N_FEATURES):
+    """(feature indexes, L2-normalized counts) of one token list."""
+    counts = {}
+    for f in features(tokens):
+        idx = zlib.crc32(f.encode("utf-8")) % n_features
+        counts[idx] = counts.get(idx, 0) + 1
+    norm = sum(c * c for c in counts.values()) ** 0.5
+    return list(counts), [c / norm for c in counts.values()]
+
+
+def vectorize(token_lists, n_features: int = N_FEATURES):
+    """hashed() as a CSR matrix, one row per token list."""
+    indptr = [0]
+    indices = []
+    values = []
+    for tokens in token_lists:
+        idx, vals = hashed(tokens, n_features)
+        indices += idx
+        values += vals
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (np.array(values, dtype=np.float32), np.array(indices, dtype=np.int32), indptr),
+        shape=(len(indptr) - 1, n_features),
+    )
+
+
+# -------------------------
+# Ranker
+# -------------------------
+class TextRanker:
+    def __init__(self, model: dict):
+        self.classes = list(model["classes"])
+        self.weights = model["weights"]        # n_features x n_classes
+        self.intercept = model["intercept"]
+        self.n_features = model["n_features"]
+
+    def probabilities(self, token_lists) -> np.ndarray:
+        if len(token_lists) == 1:
+            # one text: gather its weight rows instead of building a matrix
+            idx, vals = hashed(token_lists[0], self.n_features)
+            scores = (np.array(vals, dtype=np.float32) @ self.weights[idx] + self.intercept)[None, :]
+        else:
+            scores = vectorize(token_lists, self.n_features) @ self.weights + self.intercept
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    def rank(self, token_lists: list, kb: dict, k: int = 3) -> list:
+        """
+        For each token list, KB indexes of up to k conditions (most likely
+        first), or [] when the model is unsure and the rules should decide.
+        Classes missing from the current KB are ignored.
+        """
+        if not token_lists:
+            return []
+        positions = kb["positions"]
+        ranked = []
+        for row in self.probabilities(token_lists):
+            order = np.argsort(-row, kind="stable")
+            top = []
+            for c in order:
+                share = row[c]
+                if share < (MIN_SHARE if top else MIN_CONFIDENCE) or len(top) == k:
+                    break
+                idx = positions.get(self.classes[c])
+                if idx is not None:
+                    top.append(idx)
+            ranked.append(top)
+        return ranked
+
+
+def weights_path(path: str) -> str:
+    """The .npy weight file that goes with the model metadata at path."""
+    return os.path.splitext(path)[0] + ".npy"
+
+
+def save(model: dict, path: str):
+    """Write the weights (.npy), then the metadata that points at them (JSON)."""
+    np.save(weights_path(path), model["weights"], allow_pickle=False)
+    meta = {k: v for k, v in model.items() if k != "weights"}
+    meta["intercept"] = [float(v) for v in model["intercept"]]
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+def load(path: str) -> TextRanker:
+    """Load a trained model with its weights memory-mapped. Raises ValueError if unusable."""
+    with open(path, encoding="utf-8") as f:
+        model = json.load(f)
+    if not isinstance(model, dict) or model.get("format") != MODEL_FORMAT:
+        raise ValueError(f"{path}: not a ranker model (format {MODEL_FORMAT})")
+
+    # plain arrays only; a truncated file fails here rather than at ranking
+    model["weights"] = np.load(weights_path(path), mmap_mode="r", allow_pickle=False)
+    model["intercept"] = np.array(model["intercept"], dtype=np.float32)
+    expected = (model["n_features"], len(model["classes"]))
+    if model["weights"].shape != expected or model["intercept"].shape != expected[1:]:
+        raise ValueError(f"{path}: weights do not match the model ({model['weights'].shape}, expected {expected})")
+    return TextRanker(model)
+
+
+# -------------------------
+# Training
+# -------------------------
+def keyword_examples(conditions: list, per_condition: int = 50, seed: int = 0):
+    """(text, condition id) from every keyword and random keyword combinations."""
+    rnd = random.Random(seed)
+    for item in conditions:
+        keywords = item["keywords"]
+        for k in keywords:
+            yield k, item["id"]
+        for _ in range(per_condition):
+            picked = rnd.sample(keywords, min(len(keywords), rnd.randint(1, 3)))
+            yield " ".join(picked), item["id"]
+
+
+def read_cases(path: str, text_field: str = "symptoms", label_field: str = "condition_id"):
+    """(text, condition id) from a CSV/JSONL file or a medibotx.db case history."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".db":
+        conn = sqlite3.connect(path)
+        try:
+            yield from conn.execute(
+                "SELECT symptoms, condition_id FROM cases WHERE condition_id IS NOT NULL"
+            ).fetchall()
+        finally:
+            conn.close()
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = csv.DictReader(f) if ext == ".csv" else (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            if row.get(text_field) and row.get(label_field):
+                yield row[text_field], row[label_field]
+
+
+def train(conditions: list, cases=(), n_features: int = N_FEATURES, seed: int = 0) -> dict:
+    """Fit the model; cases are extra (text, condition id) pairs."""
+    known = {item["id"] for item in conditions}
+    examples = list(keyword_examples(conditions, seed=seed))
+    examples += [(text, label) for text, label in cases if label in known]
+
+    X = vectorize([rules.tokenize(text)[1] for text, _ in examples], n_features)
+    y = [label for _, label in examples]
+    clf = LogisticRegression(C=10.0, max_iter=2000)
+    clf.fit(X, y)
+
+    return {
+        "format": MODEL_FORMAT,
+        "n_features": n_features,
+        "classes": [str(c) for c in clf.classes_],
+        # features x classes, so a batch is one sparse x dense product
+        "weights": np.ascontiguousarray(clf.coef_.T, dtype=np.float32),
+        "intercept": clf.intercept_.astype(np.float32),
+        "examples": len(examples),
+        "accuracy": float(clf.score(X, y)),
+    }
+
+
+def _cmd_train(args) -> int:
+    if args.source:
+        with open(args.source, encoding="utf-8") as f:
+            conditions = json.load(f)
+        rules.validate_conditions(conditions)
+    else:
+        conditions = rules.CONDITIONS
+
+    cases = []
+    for path in args.cases:
+        cases += read_cases(path, args.text_field, args.label_field)
+
+    model = train(conditions, cases, args.features, args.seed)
+    save(model, args.output)
+    print(json.dumps({
+        "path": args.output,
+        "classes": len(model["classes"]),
+        "examples": model["examples"],
+        "cases": len(cases),
+        "train_accuracy": round(model["accuracy"], 4),
+    }))
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="MediBotX model ranker")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("train", help="train from the KB keywords and labeled cases")
+    p.add_argument("--source", help="JSON list of conditions (default: the loaded knowledge base)")
+    p.add_argument("--cases", action="append", default=[],
+                   help="labeled cases: CSV/JSONL or medibotx.db (repeatable)")
+    p.add_argument("--text-field", default="symptoms")
+    p.add_argument("--label-field", default="condition_id")
+    p.add_argument("--features", type=int, default=N_FEATURES, help="hashed feature space size")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("-o", "--output", default=rules.RANKER_MODEL, help="model path (default: %(default)s)")
+
+    args = parser.parse_args(argv)
+    return _cmd_train(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+"""
+PDF health reports.
+
+generate_pdf_report builds the whole document in memory, which is fine
+for a normal history. For very long histories use the streaming mode:
+
+    python report.py medibotx.db --session <session id> -o report.pdf
+
+stream_pdf_report renders the history CHUNK_CASES cases at a time and
+yields the PDF piece by piece, so memory stays bounded by one chunk.
+Rendered pages of full chunks are cached on disk by content; history is
+append-only, so a new export only renders the cases added since the
+last one.
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import threading
+import zlib
+from datetime import datetime
+
+from fpdf import FPDF
+
+CHUNK_CASES = 100
+REPORT_DIR = os.environ.get("MEDIBOTX_REPORT_DIR", os.path.join(tempfile.gettempdir(), "medibotx-reports"))
+PAGE_CACHE_FILES = 2000
+
+# A4 in points (FPDF's default page)
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+
+
+# -------------------------
+# Drawing
+# -------------------------
+def _draw_title(pdf):
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, "MediBotX Health Report", ln=True)
+
+    pdf.set_font("Arial", "", 12)
+    pdf.cell(0, 8, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True)
+    pdf.ln(5)
+
+    pdf.set_font("Arial", "B", 13)
+    pdf.cell(0, 8, "Previous Cases:", ln=True)
+    pdf.set_font("Arial", "", 11)
+
+
+def _draw_case(pdf, number, h):
+    pdf.set_font("Arial", "B", 11)
+    pdf.multi_cell(0, 7, f"Case {number}")
+    pdf.set_font("Arial", "", 11)
+    pdf.multi_cell(0, 7, f"Symptoms: {h['symptoms']}")
+    pdf.multi_cell(0, 7, f"Condition: {h['condition']}")
+    pdf.multi_cell(0, 7, f"Severity: {h['severity']}")
+    pdf.multi_cell(0, 7, f"Advice: {h['advice']}")
+    pdf.multi_cell(0, 7, f"Time: {h.get('time', '-')}")
+    if h.get("final_severity"):
+        pdf.multi_cell(0, 7, f"Final Severity: {h['final_severity']}")
+        pdf.multi_cell(0, 7, f"Final Advice: {h['final_advice']}")
+    pdf.ln(3)
+
+
+def _draw_current_case(pdf, current_case):
+    pdf.ln(5)
+    pdf.set_font("Arial", "B", 13)
+    pdf.cell(0, 8, "Current Case:", ln=True)
+    pdf.set_font("Arial", "", 11)
+
+    if current_case is None:
+        pdf.multi_cell(0, 7, "No active case currently.")
+    else:
+        pdf.multi_cell(0, 7, f"Symptoms: {current_case['symptoms']}")
+        pdf.multi_cell(0, 7, f"Condition: {current_case['result']['condition']}")
+        pdf.multi_cell(0, 7, f"Severity: {current_case['result']['severity']}")
+        pdf.multi_cell(0, 7, f"Advice: {current_case['result']['advice']}")
+
+        if current_case.get("final"):
+            pdf.ln(2)
+            pdf.set_font("Arial", "B", 11)
+            pdf.multi_cell(0, 7, "Final Follow-up Result:")
+            pdf.set_font("Arial", "", 11)
+            pdf.multi_cell(0, 7, f"Final Severity: {current_case['final']['final_severity']}")
+            pdf.multi_cell(0, 7, f"Final Advice: {current_case['final']['final_advice']}")
+
+
+# -------------------------
+# In-memory report
+# -------------------------
+def generate_pdf_report(history_list, current_case, progress=None):
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    _draw_title(pdf)
+
+    if not history_list:
+        pdf.multi_cell(0, 7, "No previous cases.")
+    else:
+        for i, h in enumerate(history_list, start=1):
+            _draw_case(pdf, i, h)
+            if progress:
+                progress(i, len(history_list) + 1)
+
+    _draw_current_case(pdf, current_case)
+
+    # build in memory (fpdf returns latin-1 str, fpdf2 a bytearray)
+    out = pdf.output(dest="S")
+    if progress:
+        progress(len(history_list) + 1, len(history_list) + 1)
+    return out.encode("latin-1") if isinstance(out, str) else bytes(out)
+
+
+# -------------------------
+# Streaming report
+# -------------------------
+def _render_pages(draw, *args) -> list:
+    """Draw into a fresh document; its pages as compressed content streams."""
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    # fixed font order, so every document refers to /F1 (regular) and /F2 (bold)
+    pdf.set_font("Arial", "", 11)
+    pdf.set_font("Arial", "B", 11)
+    pdf.add_page()
+    draw(pdf, *args)
+
+    pages = []
+    for n in sorted(pdf.pages):
+        content = getattr(pdf.pages[n], "contents", pdf.pages[n])
+        content = content.encode("latin-1") if isinstance(content, str) else bytes(content)
+        pages.append(zlib.compress(content))
+    return pages
+
+
+def _draw_cases(pdf, first_number, cases):
+    for i, h in enumerate(cases, start=first_number):
+        _draw_case(pdf, i, h)
+
+
+def _draw_tail(pdf, first_number, cases, current_case):
+    if first_number == 1 and not cases:
+        pdf.multi_cell(0, 7, "No previous cases.")
+    _draw_cases(pdf, first_number, cases)
+    _draw_current_case(pdf, current_case)
+
+
+def prune_files(directory: str, max_files: int):
+    """Delete the least recently used files beyond max_files."""
+    try:
+        entries = [e for e in os.scandir(directory) if e.is_file()]
+    except FileNotFoundError:
+        return
+    if len(entries) <= max_files:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for entry in entries[:len(entries) - max_files]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+class PageCache:
+    """Compressed page streams of rendered chunks, one file per chunk."""
+
+    _LENGTH = struct.Struct("<I")
+
+    def __init__(self, directory: str = os.path.join(REPORT_DIR, "pages"), max_files: int = PAGE_CACHE_FILES):
+        self.directory = directory
+        self.max_files = max_files
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(first_number: int, cases: list) -> str:
+        payload = json.dumps([CHUNK_CASES, first_number, cases], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+
+        pages, pos = [], 0
+        while pos < len(data):
+            (length,) = self._LENGTH.unpack_from(data, pos)
+            pos += self._LENGTH.size
+            pages.append(data[pos:pos + length])
+            pos += length
+        return pages
+
+    def put(self, key: str, pages: list):
+        path = os.path.join(self.directory, key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            for page in pages:
+                f.write(self._LENGTH.pack(len(page)))
+                f.write(page)
+        os.replace(tmp, path)
+        prune_files(self.directory, self.max_files)
+
+
+class _PdfWriter:
+    """
+    Writes page streams as they come; only the object offsets and the
+    page list are kept until the trailer.
+    Objects 1-4 are reserved for the page tree, resources and fonts.
+    """
+
+    def __init__(self):
+        self.pos = 0
+        self.offsets = {}
+        self.kids = []
+        self.next_obj = 5
+
+    def _obj(self, num: int, body: bytes) -> bytes:
+        self.offsets[num] = self.pos
+        data = b"%d 0 obj\n%s\nendobj\n" % (num, body)
+        self.pos += len(data)
+        return data
+
+    def header(self) -> bytes:
+        data = b"%PDF-1.3\n"
+        self.pos += len(data)
+        return data
+
+    def pages(self, streams: list):
+        for stream in streams:
+            page, content = self.next_obj, self.next_obj + 1
+            self.next_obj += 2
+            self.kids.append(page)
+            yield self._obj(page, b"<</Type /Page /Parent 1 0 R /Resources 2 0 R "
+                                  b"/MediaBox [0 0 %.2f %.2f] /Contents %d 0 R>>"
+                                  % (PAGE_WIDTH, PAGE_HEIGHT, content))
+            yield self._obj(content, b"<</Filter /FlateDecode /Length %d>>\nstream\n%s\nendstream"
+                                     % (len(stream), stream))
+
+    def trailer(self) -> bytes:
+        catalog, info = self.next_obj, self.next_obj + 1
+        kids = b" ".join(b"%d 0 R" % k for k in self.kids)
+        parts = [
+            self._obj(1, b"<</Type /Pages /Kids [%s] /Count %d>>" % (kids, len(self.kids))),
+            self._obj(2, b"<</ProcSet [/PDF /Text] /Font <</F1 3 0 R /F2 4 0 R>>>>"),
+            self._obj(3, b"<</Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding>>"),
+            self._obj(4, b"<</Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding>>"),
+            self._obj(catalog, b"<</Type /Catalog /Pages 1 0 R>>"),
+            self._obj(info, b"<</Producer (MediBotX) /CreationDate (D:%s)>>"
+                            % datetime.now().strftime("%Y%m%d%H%M%S").encode("ascii")),
+        ]
+
+        xref = self.pos
+        parts.append(b"xref\n0 %d\n0000000000 65535 f \n" % (info + 1))
+        parts += [b"%010d 00000 n \n" % self.offsets[num] for num in range(1, info + 1)]
+        parts.append(b"trailer\n<</Size %d /Root %d 0 R /Info %d 0 R>>\nstartxref\n%d\n%%%%EOF\n"
+                     % (info + 1, catalog, info, xref))
+        return b"".join(parts)
+
+
+def stream_pdf_report(history_chunks, current_case, cache: PageCache = None, progress=None, total_chunks=None):
+    """
+    Yield the report as bytes pieces.
+    history_chunks: lists of cases, oldest first, CHUNK_CASES per list
+    (the last one may be shorter). Full chunks are taken from / stored in
+    cache; the last partial chunk is drawn together with the current case.
+    """
+    writer = _PdfWriter()
+    yield writer.header()
+
+    title = _render_pages(_draw_title)
+    yield from writer.pages(title)
+
+    number, done, tail = 1, 0, []
+    for cases in history_chunks:
+        if len(cases) < CHUNK_CASES:
+            tail = cases
+            break
+
+        key = PageCache.key(number, cases) if cache else None
+        pages = cache.get(key) if cache else None
+        if pages is None:
+            pages = _render_pages(_draw_cases, number, cases)
+            if cache:
+                cache.put(key, pages)
+        yield from writer.pages(pages)
+
+        number += len(cases)
+        done += 1
+        if progress and total_chunks:
+            progress(done, total_chunks + 1)
+
+    yield from writer.pages(_render_pages(_draw_tail, number, tail, current_case))
+    yield writer.trailer()
+
+    if progress and total_chunks:
+        progress(total_chunks + 1, total_chunks + 1)
+
+
+def write_pdf_report(path: str, history_chunks, current_case, **kwargs):
+    """Stream the report to path (written to a temp file, then renamed)."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        for piece in stream_pdf_report(history_chunks, current_case, **kwargs):
+            f.write(piece)
+    os.replace(tmp, path)
+    return path
+
+
+# -------------------------
+# CLI
+# -------------------------
+def main(argv=None) -> int:
+    from storage import CaseStore
+
+    parser = argparse.ArgumentParser(description="Export a MediBotX case history as PDF")
+    parser.add_argument("db", help="case history database (medibotx.db)")
+    parser.add_argument("--session", required=True,
+                        help="session_id of the cases: the app's hashed account id, or the random id of a session "
+                             "without login")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--no-cache", action="store_true", help="render every page again")
+    args = parser.parse_args(argv)
+
+    store = CaseStore(args.db)
+    try:
+        total = store.count(args.session)
+        write_pdf_report(
+            args.output, store.iter_cases(args.session, CHUNK_CASES), None,
+            cache=None if args.no_cache else PageCache(),
+            total_chunks=total // CHUNK_CASES,
+        )
+    finally:
+        store.close()
+    print(f"{total} cases -> {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,78 @@
+import argparse
+import bisect
+import csv
+import hashlib
+import heapq
+import io
+import json
+import os
+import pickle
 import re
+import struct
+import sys
+import threading
+import warnings
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
 
 # -------------------------
 # Helper functions
 # -------------------------
+class _NormalizeTable(dict):
+    """
+    str.translate table, filled per character on first use:
+    - letters/digits that lower to a-z/0-9 -> lowercase
+    - apostrophes -> "'" (dropped inside words by tokenize)
+    - everything else -> space
+    Always one character for one, so offsets line up with the input.
+    """
+
+    def __missing__(self, code: int) -> str:
+        ch = chr(code)
+        low = ch.lower()
+        if ch in "'\u2019\u2018`":
+            out = "'"
+        elif "a" <= low[:1] <= "z" or "0" <= low[:1] <= "9":
+            # (a few characters lower to two, e.g. "İ" -> "i" + a dot)
+            out = low[0]
+        else:
+            out = " "
+        self[code] = out
+        return out
+
+
+_NORMALIZE = _NormalizeTable()
+# apostrophes inside words are dropped (contractions), others separate
+_INNER_APOSTROPHE = re.compile(r"(?<=[a-z0-9])'(?=[a-z0-9])")
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+
+
+def tokenize(text: str, offsets: bool = False):
+    """
+    Normalize text in one pass.
+    Returns (normalized text, tokens, spans): tokens are the words of the
+    normalized text; with offsets=True spans are their (start, end) in
+    the input, else None.
+    Contractions lose their apostrophe: "can't" -> "cant", "don't" -> "dont".
+    """
+    s = text.translate(_NORMALIZE)
+    if offsets:
+        tokens, spans = [], []
+        for m in _TOKEN_RE.finditer(s):
+            tokens.append(m.group().replace("'", ""))
+            spans.append(m.span())
+        return " ".join(tokens), tokens, spans
+
+    if "'" in s:
+        s = _INNER_APOSTROPHE.sub("", s).replace("'", " ")
+    tokens = s.split()
+    return " ".join(tokens), tokens, None
+
+
 def preprocess(text: str) -> str:
-    text = text.lower()
-    text = text.replace("can't", "cant")
-    text = re.sub(r"[^a-z0-9\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    return tokenize(text)[0]
 
 
 def keyword_match_score(text: str, keywords: list) -> int:
@@ -33,11 +97,613 @@ def keyword_match_score(text: str, keywords: list) -> int:
     return score
 
 
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over all keywords of a knowledge base.
+    One scan of the preprocessed text scores every condition with the
+    same rules as keyword_match_score:
+    - phrase (keyword with a space) -> substring match, +3
+    - single keyword -> word boundary match, +2
+    """
+
+    def __init__(self, conditions: list):
+        self.keywords = []   # pattern id -> keyword
+        self.is_phrase = []  # pattern id -> bool
+        self.postings = []   # pattern id -> [(condition index, weight)]
+
+        ids = {}
+        for idx, item in enumerate(conditions):
+            for k in item["keywords"]:
+                k = sys.intern(k.lower())
+                if not k:
+                    continue
+                pid = ids.get(k)
+                if pid is None:
+                    pid = ids[k] = len(self.keywords)
+                    self.keywords.append(k)
+                    self.is_phrase.append(" " in k)
+                    self.postings.append([])
+                # duplicated keywords count twice, like the per-keyword loop
+                self.postings[pid].append((idx, 3 if " " in k else 2))
+
+        self.n_conditions = len(conditions)
+        self._weights = None
+        self._build_bounds()
+        self._build()
+
+    def _build_bounds(self):
+        # per-condition keyword lists and score upper bounds for top_k
+        self.cond_terms = [[] for _ in range(self.n_conditions)]
+        self.term_max = []   # pattern id -> most it adds to any one condition
+        for pid, postings in enumerate(self.postings):
+            per_cond = {}
+            for idx, weight in postings:
+                self.cond_terms[idx].append((pid, weight))
+                per_cond[idx] = per_cond.get(idx, 0) + weight
+            self.term_max.append(max(per_cond.values()))
+        self.cond_max = [sum(w for _, w in terms) for terms in self.cond_terms]
+
+    def state(self) -> dict:
+        """Plain-data state for compiled artifacts (the scipy matrix is rebuilt on demand)."""
+        state = self.__dict__.copy()
+        state["_weights"] = None
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict):
+        automaton = cls.__new__(cls)
+        automaton.__dict__.update(state)
+        return automaton
+
+    def _build(self):
+        goto = [{}]
+        out = [[]]
+        for pid, k in enumerate(self.keywords):
+            state = 0
+            for ch in k:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = goto[state][ch] = len(goto)
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(pid)
+
+        # breadth-first failure links (depth-1 states fail to the root)
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+                queue.append(nxt)
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def _bounded(self, text: str, start: int, end: int, k: str) -> bool:
+        # same semantics as r"\b" on both sides of the keyword
+        before = start > 0 and _is_word_char(text[start - 1])
+        after = end < len(text) and _is_word_char(text[end])
+        return before != _is_word_char(k[0]) and after != _is_word_char(k[-1])
+
+    def scan(self, text: str) -> set:
+        """Return the ids of all keywords matched in text."""
+        return self.resume(0, text)[1]
+
+    def resume(self, state: int, text: str):
+        """
+        Continue a scan from state (0 at the start of a text).
+        Returns (state at the end, ids of keywords ending in text). The
+        characters around text count as non-word for word boundaries, so
+        pieces must be cut at spaces.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pid in out[state]:
+                if pid in found:
+                    continue
+                k = self.keywords[pid]
+                if self.is_phrase[pid] or self._bounded(text, i + 1 - len(k), i + 1, k):
+                    found.add(pid)
+        return state, found
+
+    def top_k(self, text: str, k: int = 3) -> list:
+        """Indexes of the k best conditions for text (see rank)."""
+        return self.rank(self.scan(text), k)
+
+    def rank(self, matched: set, k: int = 3, fuzzy=(), fuzzy_weight: float = 1.0, needs_exact=()) -> list:
+        """
+        Indexes of the k best conditions (score desc, KB order on ties)
+        for a set of matched keyword ids, without scoring every matching
+        condition (MaxScore-style).
+        fuzzy: ids in matched that only matched after typo correction;
+        their weights are scaled by fuzzy_weight (0 to 1).
+        needs_exact: conditions left out when only fuzzy ids match them.
+        - keywords are visited from the highest to the lowest bound
+        - a condition is scored in full only if its max score can still
+          reach the current k-th best
+        - once the remaining keywords together cannot reach the k-th
+          best, conditions seen only through them are skipped
+        """
+        terms = sorted(matched, key=lambda pid: self.term_max[pid], reverse=True)
+        remaining = sum(self.term_max[pid] for pid in terms)
+
+        heap = []  # k best as (score, -index); worst on top
+        seen = set()
+        for pid in terms:
+            if len(heap) == k and remaining < heap[0][0]:
+                break
+            remaining -= self.term_max[pid]
+
+            for idx, _ in self.postings[pid]:
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                if len(heap) == k and self.cond_max[idx] < heap[0][0]:
+                    continue
+
+                if fuzzy:
+                    exact = sum(w for p, w in self.cond_terms[idx] if p in matched and p not in fuzzy)
+                    if not exact and idx in needs_exact:
+                        continue
+                    score = exact + sum(w * fuzzy_weight for p, w in self.cond_terms[idx] if p in fuzzy)
+                else:
+                    score = sum(w for p, w in self.cond_terms[idx] if p in matched)
+                entry = (score, -idx)
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+
+        return [-neg for _, neg in sorted(heap, reverse=True)]
+
+    def weight_matrix(self):
+        """Sparse keyword x condition matrix of weights (built on first use)."""
+        if self._weights is None:
+            import numpy as np
+            from scipy import sparse
+
+            rows, cols, vals = [], [], []
+            for pid, postings in enumerate(self.postings):
+                for idx, weight in postings:
+                    rows.append(pid)
+                    cols.append(idx)
+                    vals.append(weight)
+            # duplicate (keyword, condition) entries are summed
+            self._weights = sparse.csr_matrix(
+                (np.array(vals, dtype=np.int32), (rows, cols)),
+                shape=(len(self.keywords), self.n_conditions),
+            )
+        return self._weights
+
+    def scores(self, text: str) -> dict:
+        """Return {condition index: score} for every condition with score > 0."""
+        scores = {}
+        for pid in self.scan(text):
+            for idx, weight in self.postings[pid]:
+                scores[idx] = scores.get(idx, 0) + weight
+        return scores
+
+
+def build_token_index(conditions: list) -> dict:
+    """
+    Inverted index: token -> indexes of the conditions that use it.
+    - words:   single keywords, looked up by exact input token
+    - phrases: last word of each phrase, looked up by every token prefix
+      (phrases are substring matches, so their last word only has to
+      start an input token)
+    """
+    words = {}
+    phrases = {}
+    for idx, item in enumerate(conditions):
+        for k in item["keywords"]:
+            k = sys.intern(k.lower())
+            if not k:
+                continue
+            if " " in k:
+                phrases.setdefault(k.rsplit(" ", 1)[1], set()).add(idx)
+            else:
+                words.setdefault(k, set()).add(idx)
+
+    return {
+        "words": words,
+        "phrases": phrases,
+        "max_phrase_word": max((len(w) for w in phrases), default=0),
+    }
+
+
+def candidate_conditions(tokens, index: dict) -> set:
+    """Indexes of conditions sharing at least one token with the input tokens."""
+    words = index["words"]
+    phrases = index["phrases"]
+    max_len = index["max_phrase_word"]
+
+    found = set()
+    for tok in set(tokens):
+        if tok in words:
+            found |= words[tok]
+        for j in range(1, min(len(tok), max_len) + 1):
+            ids = phrases.get(tok[:j])
+            if ids:
+                found |= ids
+    return found
+
+
+# -------------------------
+# Typo tolerance
+# SymSpell-style deletion index over the KB vocabulary: every term is
+# stored under all strings reachable by deleting up to max_distance
+# characters, so a token's candidates are found by looking up its own
+# deletes instead of comparing it with every term.
+# -------------------------
+FUZZY_MAX_DISTANCE = int(os.environ.get("MEDIBOTX_FUZZY_DISTANCE", "2"))   # 0 disables
+FUZZY_MIN_LENGTH = 5    # shorter tokens are too close to ordinary words
+FUZZY_LONG_LENGTH = 9   # tokens this long may be two edits away, shorter ones one
+# ordinary words within reach of a KB term ("fists" -> "fits"); never corrected
+FUZZY_PROTECTED = frozenset({
+    "black", "chess", "fewer", "fists", "heard", "hears", "hearth", "hearty",
+    "heartache", "heartaches", "injection", "injections", "kneel", "paint",
+    "paints", "plain", "pleasure", "spike", "spikes", "water", "waters",
+})
+# share of a keyword's weight when it only matched after correction;
+# cached results are per KB version, so set it before loading the KB
+FUZZY_WEIGHT = float(os.environ.get("MEDIBOTX_FUZZY_WEIGHT", "0.5"))
+FUZZY_CACHE_SIZE = 50000    # remembered token lookups per KB
+
+
+def _deletes(word: str, distance: int) -> set:
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance with adjacent transpositions (optimal string alignment)."""
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def build_fuzzy_index(conditions: list, max_distance: int = FUZZY_MAX_DISTANCE) -> dict:
+    """
+    - terms:   every keyword word, plus phrases with the spaces removed
+               ("chestpain"), -> (replacement text, keyword count)
+    - deletes: delete variant -> terms
+    - cache:   token -> closest_term result, filled as tokens are seen
+    - span:    most words in one keyword
+    """
+    terms = {}
+    span = 1
+    for item in conditions:
+        for k in item["keywords"]:
+            k = k.lower()
+            span = max(span, len(k.split()))
+            variants = [(w, w) for w in k.split()]
+            if " " in k:
+                variants.append((k.replace(" ", ""), k))
+            for term, replacement in variants:
+                term = sys.intern(term)
+                _, count = terms.get(term, (replacement, 0))
+                terms[term] = (sys.intern(replacement), count + 1)
+
+    # only as deep as closest_term can reach: tokens of FUZZY_MIN_LENGTH
+    # allow one edit and tokens of FUZZY_LONG_LENGTH two, so shorter
+    # terms need fewer
+    deletes = {}
+    for term in terms:
+        reach = 0 if len(term) < FUZZY_MIN_LENGTH - 1 else 1 if len(term) < 6 else 2
+        for variant in _deletes(term, min(reach, max_distance)) if max_distance else ():
+            deletes.setdefault(variant, []).append(term)
+
+    return {"terms": terms, "deletes": deletes, "max_distance": max_distance, "cache": {}, "span": span}
+
+
+def closest_term(token: str, index: dict):
+    """Closest KB term to token within its allowed distance (None if none)."""
+    if len(token) < FUZZY_MIN_LENGTH or token.isdigit() or token in FUZZY_PROTECTED or " " in token:
+        # a token with a space is already a KB phrase (see build_lemma_index)
+        return None
+    cache = index["cache"]
+    if token in cache:
+        return cache[token]
+    if len(cache) >= FUZZY_CACHE_SIZE:
+        cache.clear()
+    best = cache[token] = _closest_term(token, index)
+    return best
+
+
+def _closest_term(token: str, index: dict):
+    # longer words tolerate two edits; the index may have been compiled
+    # for a larger distance than this process allows
+    distance = min(index["max_distance"], FUZZY_MAX_DISTANCE, 1 if len(token) < FUZZY_LONG_LENGTH else 2)
+    if not distance:
+        return None
+
+    deletes, terms = index["deletes"], index["terms"]
+    candidates = set()
+    for variant in _deletes(token, distance):
+        candidates.update(deletes.get(variant, ()))
+    # typos rarely change the first letter ("heartache" is not "earache")
+    candidates = {term for term in candidates if term[0] == token[0]}
+
+    best, best_key = None, None
+    for term in candidates:
+        d = edit_distance(token, term)
+        if d <= distance:
+            # nearest first, then the most used term, then alphabetical
+            key = (d, -terms[term][1], term)
+            if best_key is None or key < best_key:
+                best, best_key = term, key
+    return best
+
+
+def corrected_token(token: str, index: dict):
+    """KB replacement for a misspelled token, or None if it needs none."""
+    terms = index["terms"]
+    term = token if token in terms else closest_term(token, index)
+    if term is not None and terms[term][0] != token:
+        return terms[term][0]
+    return None
+
+
+def _windows(tokens: list, positions: list, reach: int) -> list:
+    """Token slices around positions, reach tokens to both sides, overlaps merged."""
+    windows = []
+    start, end = positions[0] - reach, positions[0] + reach
+    for i in positions[1:]:
+        if i - reach > end + 1:
+            windows.append(tokens[max(start, 0):end + 1])
+            start = i - reach
+        end = i + reach
+    windows.append(tokens[max(start, 0):end + 1])
+    return windows
+
+
+def corrected_windows(tokens: list, index: dict) -> list:
+    """
+    Token lists around misspelled tokens, with those tokens replaced by
+    their closest KB term. Each piece reaches span - 1 tokens to both
+    sides, enough for any keyword that uses a corrected token; the rest
+    of the text is unchanged and needs no rescan.
+    """
+    tokens = list(tokens)
+    fixed = []
+    for i, tok in enumerate(tokens):
+        fix = corrected_token(tok, index)
+        if fix is not None:
+            tokens[i] = fix
+            fixed.append(i)
+    if not fixed:
+        return []
+    return _windows(tokens, fixed, index["span"] - 1)
+
+
+# -------------------------
+# Inflections and synonyms
+# Every word used in a keyword is expanded once, at KB load, into a
+# table of the other forms that should match it: inflections ("vomited",
+# "headaches", "pains") and informal synonyms ("tummy"). Requests map
+# each token through the table (one dict lookup) and rescan only around
+# the tokens it changed, like typo correction but at full weight.
+# -------------------------
+# informal word -> word used in the knowledge base
+SYNONYMS = {
+    "tummy": "stomach",
+    "abdomen": "abdominal",
+    "puke": "vomiting",
+    "puking": "vomiting",
+    "threw": "throwing",    # only ever part of "throwing up"
+    "feverish": "fever",
+    "temp": "temperature",
+    "hurt": "pain",
+    "hurts": "pain",
+    "hurting": "pain",
+    "pee": "urination",
+    "peeing": "urination",
+    "urinating": "urination",
+    "tired": "fatigue",
+    "exhausted": "fatigue",
+    "exhaustion": "fatigue",
+    "queasy": "nausea",
+    "nauseous": "nausea",
+    "nauseated": "nausea",
+    "diarrhoea": "diarrhea",
+    "breathe": "breathing",
+    # verb forms of KB nouns (nouns only get plurals, see _word_forms)
+    "aching": "ache",
+    "ached": "ache",
+    "fatigued": "fatigue",
+    "cramping": "cramps",
+}
+
+# KB words whose other forms mean something else ("fit" is not "fits",
+# "lots" is not "a lot")
+LEMMA_PROTECTED = frozenset({"fits", "lot"})
+
+
+def _word_forms(word: str) -> set:
+    """
+    Candidate inflections of a KB word, by its shape:
+    - "-ing" words are verbs: vomiting <- vomit, vomits, vomited
+    - other "-s" words are plural nouns: cramps <- cramp
+    - anything else is a noun: leg <- legs, belly <- bellies
+    Nouns get no "-ed"/"-ing" forms: "cramped", "legging", "backed" or
+    "severed" mean something else.
+    """
+    if word.endswith("ing") and len(word) > 5:
+        base = word[:-3]
+        bases = {base, base + "e"}
+        if base[-1] == base[-2] and base[-1] not in "aeiouls":
+            bases.add(base[:-1])        # stopping -> stop
+        forms = set()
+        for base in bases:
+            forms |= {base, base + "s", base + "es", base + "ed"}
+            if base.endswith("e"):
+                forms.add(base + "d")
+        forms.discard(word)
+        return forms
+
+    if word.endswith("s") and not word.endswith("ss"):
+        forms = {word[:-1]}
+        if word.endswith("ies"):
+            forms.add(word[:-3] + "y")
+        elif word.endswith("es"):
+            forms.add(word[:-2])
+        return forms
+
+    if word.endswith("y") and word[-2] not in "aeiou":
+        return {word[:-1] + "ies"}
+    if word.endswith(("s", "x", "z", "ch", "sh")):
+        return {word + "es", word + "s"}
+    return {word + "s"}
+
+
+def _load_stemmer():
+    try:
+        from nltk.stem.snowball import SnowballStemmer
+    except ImportError:
+        warnings.warn("nltk is not installed; keywords are expanded with synonyms only")
+        return None
+    return SnowballStemmer("english").stem
+
+
+def build_lemma_index(conditions: list, synonyms: dict = SYNONYMS) -> dict:
+    """
+    - table: other form -> KB word, for every word used in a keyword.
+      Inflections come from suffix rules (see _word_forms) and are kept
+      only when nltk's
+      Snowball stemmer gives them the KB word's stem; words of the KB
+      itself are never remapped. Phrases written as one word
+      ("chestpain") map to the phrase.
+    - span:  most words in one keyword
+    """
+    words = set()
+    phrases = {}
+    span = 1
+    for item in conditions:
+        for k in item["keywords"]:
+            parts = k.lower().split()
+            words.update(parts)
+            span = max(span, len(parts))
+            if len(parts) > 1:
+                phrases["".join(parts)] = " ".join(parts)
+
+    table = {}
+    stem = _load_stemmer()
+    if stem:
+        # a form shared by several words goes to the closest in length
+        best = {}
+        for word in sorted(words):
+            if len(word) < 3 or word in LEMMA_PROTECTED or word.isdigit():
+                continue
+            word_stem = stem(word)
+            for form in _word_forms(word):
+                if form in words or stem(form) != word_stem:
+                    continue
+                key = (abs(len(form) - len(word)), word)
+                if form not in best or key < best[form]:
+                    best[form] = key
+                    table[form] = word
+
+    for form, word in synonyms.items():
+        if word in words and form not in words:
+            table[form] = word
+
+    for joined, phrase in phrases.items():
+        if joined not in words:
+            table[joined] = phrase
+
+    return {"table": {sys.intern(f): sys.intern(w) for f, w in table.items()}, "span": span}
+
+
+def lemma_tokens(tokens: list, index: dict):
+    """(tokens mapped to KB words or phrases, positions that changed)."""
+    table = index["table"]
+    out = tokens
+    changed = []
+    for i, tok in enumerate(tokens):
+        word = table.get(tok)
+        if word is not None:
+            if not changed:
+                out = list(tokens)
+            out[i] = word
+            changed.append(i)
+    return out, changed
+
+
+# -------------------------
+# Keyword matching
+# -------------------------
+def match_keywords(kb: dict, text: str, tokens: list):
+    """
+    (matched keyword ids, ids matched only after typo correction) for
+    normalized text and its tokens (see tokenize).
+    - exact matches, as keyword_match_score finds them
+    - plus keywords matched after mapping inflections and synonyms
+    - plus keywords matched after typo correction (the fuzzy ids)
+    The last two only rescan windows around the tokens they changed.
+    Typo correction only adds to exact evidence: without an exact match
+    there are no fuzzy ids, and a High severity condition still needs
+    one of its own (kb["needs_exact"], applied when ranking).
+    """
+    automaton, index = kb["automaton"], kb["token_index"]
+    matched = set()
+    if candidate_conditions(tokens, index):
+        matched = automaton.scan(text)
+
+    tokens, changed = lemma_tokens(tokens, kb["lemma_index"])
+    if changed:
+        for window in _windows(tokens, changed, kb["lemma_index"]["span"] - 1):
+            window = " ".join(window)
+            if candidate_conditions(window.split(" "), index):
+                matched |= automaton.scan(window)
+    if not matched:
+        # "visiting", "cheat" or "bloom" alone must not triage anything
+        return matched, set()
+
+    fuzzy = set()
+    for window in corrected_windows(tokens, kb["fuzzy_index"]):
+        # a corrected token can be a whole phrase ("chestpain")
+        window = " ".join(window)
+        if candidate_conditions(window.split(" "), index):
+            fuzzy |= automaton.scan(window)
+    fuzzy -= matched
+    matched |= fuzzy
+    return matched, fuzzy
+
+
 SEVERITY_RANK = {"High": 3, "Medium": 2, "Low": 1}
 
 # -------------------------
 # Conditions Knowledge Base
-# follow_up now has types: choice/number/text
+# follow_up now has types: choice/number/text, each with a stable id
+# decision_table: rules checked in order (first match wins), else "otherwise"
+#   {"any_yes": [question ids]}            -> any of them answered "Yes"
+#   {"any_answer": [question ids]}         -> any of them answered at all
+#   {"number": question id, "at_least": n} -> numeric answer >= n
 # -------------------------
 CONDITIONS = [
 
@@ -53,9 +719,17 @@ CONDITIONS = [
         ],
         "advice": "Seek emergency medical help immediately. Do not ignore chest pain.",
         "follow_up": [
-            {"q": "Is the chest pain severe and lasting more than 5 minutes?", "type": "choice"},
-            {"q": "Do you also have sweating, dizziness, or pain spreading to arm/jaw?", "type": "choice"},
+            {"id": "severe_lasting", "q": "Is the chest pain severe and lasting more than 5 minutes?", "type": "choice"},
+            {"id": "risk_signs", "q": "Do you also have sweating, dizziness, or pain spreading to arm/jaw?", "type": "choice"},
         ],
+        "decision_table": {
+            "rules": [
+                {"any_answer": ["severe_lasting", "risk_signs"], "severity": "High",
+                 "advice": "Chest pain with risk signs needs emergency care. Call emergency services immediately."},
+            ],
+            "otherwise": {"severity": "Medium",
+                          "advice": "Chest discomfort should not be ignored. Consult a doctor soon."},
+        },
     },
 
     {
@@ -69,9 +743,17 @@ CONDITIONS = [
         ],
         "advice": "Seek medical attention immediately. Breathing difficulty can be dangerous.",
         "follow_up": [
-            {"q": "Is it sudden and worsening quickly?", "type": "choice"},
-            {"q": "Do you feel chest tightness or wheezing?", "type": "choice"},
+            {"id": "sudden_worsening", "q": "Is it sudden and worsening quickly?", "type": "choice"},
+            {"id": "chest_tightness", "q": "Do you feel chest tightness or wheezing?", "type": "choice"},
         ],
+        "decision_table": {
+            "rules": [
+                {"any_yes": ["sudden_worsening", "chest_tightness"], "severity": "High",
+                 "advice": "Breathing difficulty may be serious. Seek urgent medical attention immediately."},
+            ],
+            "otherwise": {"severity": "Medium",
+                          "advice": "If breathing discomfort continues, consult a doctor and avoid exertion."},
+        },
     },
 
     {
@@ -82,8 +764,8 @@ CONDITIONS = [
         "keywords": ["seizure", "fits", "convulsions"],
         "advice": "Seek urgent medical help.",
         "follow_up": [
-            {"q": "Did the person lose consciousness?", "type": "choice"},
-            {"q": "How many minutes did the episode last?", "type": "number", "min": 0, "max": 30},
+            {"id": "lost_consciousness", "q": "Did the person lose consciousness?", "type": "choice"},
+            {"id": "episode_minutes", "q": "How many minutes did the episode last?", "type": "number", "min": 0, "max": 30},
         ],
     },
 
@@ -95,8 +777,8 @@ CONDITIONS = [
         "keywords": ["heavy bleeding", "severe bleeding", "blood loss", "bleeding a lot"],
         "advice": "Apply pressure to the wound and seek emergency help immediately.",
         "follow_up": [
-            {"q": "Is the bleeding not stopping even after applying pressure?", "type": "choice"},
-            {"q": "Is the person feeling dizzy or weak?", "type": "choice"},
+            {"id": "not_stopping", "q": "Is the bleeding not stopping even after applying pressure?", "type": "choice"},
+            {"id": "dizzy_weak", "q": "Is the person feeling dizzy or weak?", "type": "choice"},
         ],
     },
 
@@ -109,9 +791,16 @@ CONDITIONS = [
         "keywords": ["fever", "high temperature", "body pain", "fatigue", "weakness", "headache"],
         "advice": "Rest, drink fluids, and monitor temperature. Consult a doctor if fever lasts >2 days.",
         "follow_up": [
-            {"q": "How many days have you had fever?", "type": "number", "min": 0, "max": 14},
-            {"q": "Do you also have sore throat, cough, or chills?", "type": "choice"},
+            {"id": "fever_days", "q": "How many days have you had fever?", "type": "number", "min": 0, "max": 14},
+            {"id": "other_symptoms", "q": "Do you also have sore throat, cough, or chills?", "type": "choice"},
         ],
+        "decision_table": {
+            "rules": [
+                {"number": "fever_days", "at_least": 3, "severity": "Medium",
+                 "advice": "Fever lasting 3+ days needs doctor consultation and testing if required."},
+            ],
+            "otherwise": {"severity": "Low", "advice": "Rest, fluids, and monitor temperature."},
+        },
     },
 
     {
@@ -122,9 +811,16 @@ CONDITIONS = [
         "keywords": ["stomach pain", "abdominal pain", "stomach ache", "belly pain", "cramps"],
         "advice": "Eat light food and drink ORS.",
         "follow_up": [
-            {"q": "Do you have vomiting or loose motions along with stomach pain?", "type": "choice"},
-            {"q": "Rate your stomach pain from 1 to 10", "type": "number", "min": 1, "max": 10},
+            {"id": "vomiting_diarrhea", "q": "Do you have vomiting or loose motions along with stomach pain?", "type": "choice"},
+            {"id": "pain_score", "q": "Rate your stomach pain from 1 to 10", "type": "number", "min": 1, "max": 10},
         ],
+        "decision_table": {
+            "rules": [
+                {"number": "pain_score", "at_least": 7, "severity": "Medium",
+                 "advice": "Severe stomach pain should be checked by a doctor soon."},
+            ],
+            "otherwise": {"severity": "Low", "advice": "Light diet + hydration. Avoid spicy/oily meals."},
+        },
     },
 
     {
@@ -132,12 +828,20 @@ CONDITIONS = [
         "condition": "Food Poisoning / Diarrhea",
         "severity": "Medium",
         "doctor": "Gastroenterologist",
-        "keywords": ["vomiting", "nausea", "diarrhea", "loose motions", "watery stools"],
+        "keywords": ["vomiting", "throwing up", "nausea", "diarrhea", "loose motions", "watery stools"],
         "advice": "ORS and hydration are essential.",
         "follow_up": [
-            {"q": "How many times today?", "type": "number", "min": 0, "max": 25},
-            {"q": "Are you able to drink fluids?", "type": "choice"},
+            {"id": "episodes_today", "q": "How many times today?", "type": "number", "min": 0, "max": 25},
+            {"id": "can_drink", "q": "Are you able to drink fluids?", "type": "choice"},
         ],
+        "decision_table": {
+            "rules": [
+                {"number": "episodes_today", "at_least": 6, "severity": "High",
+                 "advice": "High risk of dehydration. Seek medical help quickly and continue ORS if possible."},
+            ],
+            "otherwise": {"severity": "Medium",
+                          "advice": "Take ORS, rest, and eat bland food. Consult a doctor if symptoms persist."},
+        },
     },
 
     {
@@ -148,9 +852,17 @@ CONDITIONS = [
         "keywords": ["burning urination", "frequent urination", "uti"],
         "advice": "Drink water and consult a doctor.",
         "follow_up": [
-            {"q": "Do you have fever or back pain?", "type": "choice"},
-            {"q": "How many days has this continued?", "type": "number", "min": 0, "max": 30},
+            {"id": "fever_back_pain", "q": "Do you have fever or back pain?", "type": "choice"},
+            {"id": "days", "q": "How many days has this continued?", "type": "number", "min": 0, "max": 30},
         ],
+        "decision_table": {
+            "rules": [
+                {"any_yes": ["fever_back_pain"], "severity": "Medium",
+                 "advice": "UTI symptoms with fever/back pain need doctor evaluation soon."},
+            ],
+            "otherwise": {"severity": "Low",
+                          "advice": "Drink water and monitor. Consult doctor if burning continues."},
+        },
     },
 
     {
@@ -161,8 +873,8 @@ CONDITIONS = [
         "keywords": ["ear pain", "ear ache", "ear infection"],
         "advice": "Avoid water in ear and consult ENT.",
         "follow_up": [
-            {"q": "Is there ear discharge?", "type": "choice"},
-            {"q": "Is hearing reduced?", "type": "choice"},
+            {"id": "discharge", "q": "Is there ear discharge?", "type": "choice"},
+            {"id": "hearing_reduced", "q": "Is hearing reduced?", "type": "choice"},
         ],
     },
 
@@ -174,7 +886,7 @@ CONDITIONS = [
         "keywords": ["watery eyes", "eye irritation", "red eyes", "eye pain"],
         "advice": "Avoid rubbing eyes and use clean water.",
         "follow_up": [
-            {"q": "Is there redness or itching?", "type": "choice"},
+            {"id": "redness_itching", "q": "Is there redness or itching?", "type": "choice"},
         ],
     },
 
@@ -186,7 +898,7 @@ CONDITIONS = [
         "keywords": ["burping", "gas", "bloating", "belching"],
         "advice": "Avoid carbonated drinks and eat slowly.",
         "follow_up": [
-            {"q": "Does it worsen after meals?", "type": "choice"},
+            {"id": "after_meals", "q": "Does it worsen after meals?", "type": "choice"},
         ],
     },
 
@@ -198,7 +910,7 @@ CONDITIONS = [
         "keywords": ["leg pain", "calf pain", "thigh pain"],
         "advice": "Rest and gentle stretching.",
         "follow_up": [
-            {"q": "Did pain start after physical activity?", "type": "choice"},
+            {"id": "after_activity", "q": "Did pain start after physical activity?", "type": "choice"},
         ],
     },
 
@@ -210,7 +922,7 @@ CONDITIONS = [
         "keywords": ["arm pain", "shoulder pain", "elbow pain"],
         "advice": "Avoid strain and rest.",
         "follow_up": [
-            {"q": "Is movement painful?", "type": "choice"},
+            {"id": "painful_movement", "q": "Is movement painful?", "type": "choice"},
         ],
     },
 
@@ -222,7 +934,7 @@ CONDITIONS = [
         "keywords": ["joint pain", "knee pain", "shoulder joint pain"],
         "advice": "Warm compress and rest.",
         "follow_up": [
-            {"q": "Is joint swelling present?", "type": "choice"},
+            {"id": "swelling", "q": "Is joint swelling present?", "type": "choice"},
         ],
     },
 
@@ -234,7 +946,7 @@ CONDITIONS = [
         "keywords": ["back pain", "lower back pain", "spine pain"],
         "advice": "Correct posture and rest.",
         "follow_up": [
-            {"q": "Does pain increase on bending?", "type": "choice"},
+            {"id": "worse_bending", "q": "Does pain increase on bending?", "type": "choice"},
         ],
     },
 
@@ -246,26 +958,542 @@ CONDITIONS = [
         "keywords": ["period pain", "menstrual cramps", "period cramps"],
         "advice": "Warm compress and rest help.",
         "follow_up": [
-            {"q": "Is pain severe enough to stop daily activity?", "type": "choice"},
+            {"id": "stops_activity", "q": "Is pain severe enough to stop daily activity?", "type": "choice"},
         ],
     },
 ]
 
 
 # -------------------------
-# Main Analyzer
+# Follow-up decision tables
 # -------------------------
-def analyze_symptoms(user_text: str):
-    text = preprocess(user_text)
+FOLLOWUP_DEFAULT = {"severity": "Low", "advice": "Monitor symptoms and consult a doctor if they worsen."}
+
+
+def _is_yes(value) -> bool:
+    return str(value).strip().lower() == "yes"
+
+
+def _as_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+# rule kind -> check(rule, answers)
+_RULE_CHECKS = {
+    "any_yes": lambda rule, answers: any(_is_yes(answers.get(q, "")) for q in rule["any_yes"]),
+    "any_answer": lambda rule, answers: any(answers.get(q) for q in rule["any_answer"]),
+    "number": lambda rule, answers: _as_int(answers.get(rule["number"], 0)) >= rule["at_least"],
+}
+
+
+def build_followup_tables(conditions: list) -> dict:
+    """condition id -> decision table, with question text -> id for lookups."""
+    tables = {}
+    for item in conditions:
+        table = item.get("decision_table")
+        if not table:
+            continue
+        tables[item["id"]] = {
+            "questions": {fu["q"]: fu["id"] for fu in item.get("follow_up", [])},
+            "rules": [(_RULE_CHECKS[_rule_kind(rule)], rule) for rule in table["rules"]],
+            "otherwise": table["otherwise"],
+        }
+    return tables
+
+
+def _rule_kind(rule: dict):
+    kinds = [kind for kind in _RULE_CHECKS if kind in rule]
+    return kinds[0] if len(kinds) == 1 else None
+
+
+# -------------------------
+# Knowledge base snapshot
+# Derived matching structures are built once per KB version and swapped
+# in as one object, so every call works on a consistent snapshot.
+# -------------------------
+def build_knowledge_base(conditions: list, version: int, compiled: dict = None) -> dict:
+    # compiled: payload of a compiled artifact, with prebuilt structures
+    if compiled:
+        automaton = KeywordAutomaton.from_state(compiled["automaton"])
+        token_index = compiled["token_index"]
+        fuzzy_index = compiled["fuzzy_index"]
+        lemma_index = compiled["lemma_index"]
+    else:
+        automaton = KeywordAutomaton(conditions)
+        token_index = build_token_index(conditions)
+        fuzzy_index = build_fuzzy_index(conditions)
+        lemma_index = build_lemma_index(conditions)
+
+    return {
+        "version": version,
+        "conditions": conditions,
+        "automaton": automaton,
+        "token_index": token_index,
+        "fuzzy_index": fuzzy_index,
+        "lemma_index": lemma_index,
+        "positions": {item["id"]: idx for idx, item in enumerate(conditions)},
+        "followup": build_followup_tables(conditions),
+        # conditions that typo-corrected keywords alone cannot select
+        "needs_exact": frozenset(idx for idx, item in enumerate(conditions) if item["severity"] == "High"),
+        "source_hash": compiled["source_hash"] if compiled else conditions_hash(conditions),
+    }
+
+
+FOLLOW_UP_TYPES = ("choice", "number", "text")
+
+
+def validate_conditions(conditions: list):
+    """Raise ValueError listing every problem found in a knowledge base."""
+    if not isinstance(conditions, list):
+        raise ValueError("Invalid knowledge base: expected a list of conditions")
+
+    errors = []
+    seen = set()
+    for pos, item in enumerate(conditions):
+        if not isinstance(item, dict):
+            errors.append(f"condition #{pos}: not an object")
+            continue
+        cid = item.get("id")
+        where = f"condition #{pos} ({cid})"
+
+        if not isinstance(cid, str) or not cid:
+            errors.append(f"{where}: missing id")
+        elif cid in seen:
+            errors.append(f"{where}: duplicate id")
+        seen.add(cid)
+
+        for field in ("condition", "advice"):
+            if not isinstance(item.get(field), str) or not item.get(field):
+                errors.append(f"{where}: missing {field}")
+
+        if item.get("severity") not in SEVERITY_RANK:
+            errors.append(f"{where}: unknown severity {item.get('severity')!r}")
+
+        keywords = item.get("keywords")
+        if not isinstance(keywords, list) or not keywords:
+            errors.append(f"{where}: keywords must be a non-empty list")
+        else:
+            for k in keywords:
+                # keywords are matched against preprocessed text
+                if not isinstance(k, str) or not k or preprocess(k) != k:
+                    errors.append(f"{where}: keyword {k!r} is not normalized")
+
+        q_types = {}  # question id -> type
+        for q_pos, fu in enumerate(item.get("follow_up", [])):
+            q_where = f"{where} follow-up #{q_pos}"
+            if not isinstance(fu, dict):
+                errors.append(f"{q_where}: not an object")
+                continue
+            if not isinstance(fu.get("q"), str) or not fu.get("q"):
+                errors.append(f"{q_where}: missing question text")
+            q_type = fu.get("type", "choice")
+            if q_type not in FOLLOW_UP_TYPES:
+                errors.append(f"{q_where}: unknown type {q_type!r}")
+            q_id = fu.get("id")
+            if not isinstance(q_id, str) or not q_id:
+                errors.append(f"{q_where}: missing id")
+            elif q_id in q_types:
+                errors.append(f"{q_where}: duplicate id {q_id!r}")
+            else:
+                q_types[q_id] = q_type
+            if q_type == "number":
+                lo, hi = fu.get("min"), fu.get("max")
+                if not isinstance(lo, int) or not isinstance(hi, int) or lo > hi:
+                    errors.append(f"{q_where}: number questions need int min <= max")
+            elif "min" in fu or "max" in fu:
+                errors.append(f"{q_where}: min/max only apply to number questions")
+
+        if "decision_table" in item:
+            errors.extend(_check_decision_table(where, item["decision_table"], q_types))
+
+    if errors:
+        raise ValueError("Invalid knowledge base:\n" + "\n".join(errors))
+
+
+def _check_outcome(where: str, outcome) -> list:
+    if not isinstance(outcome, dict):
+        return [f"{where}: outcome must be an object"]
+    errors = []
+    if outcome.get("severity") not in SEVERITY_RANK:
+        errors.append(f"{where}: unknown severity {outcome.get('severity')!r}")
+    if not isinstance(outcome.get("advice"), str) or not outcome.get("advice"):
+        errors.append(f"{where}: missing advice")
+    return errors
+
+
+def _check_decision_table(where: str, table, q_types: dict) -> list:
+    # every rule must point at a follow-up question of the right type
+    if not isinstance(table, dict) or not isinstance(table.get("rules"), list):
+        return [f"{where}: decision_table needs a rules list"]
+
+    errors = _check_outcome(f"{where} decision_table otherwise", table.get("otherwise"))
+    for r_pos, rule in enumerate(table["rules"]):
+        r_where = f"{where} decision_table rule #{r_pos}"
+        if not isinstance(rule, dict):
+            errors.append(f"{r_where}: not an object")
+            continue
+        kind = _rule_kind(rule)
+        if kind == "any_yes":
+            q_ids = rule["any_yes"]
+            if not isinstance(q_ids, list) or not q_ids:
+                errors.append(f"{r_where}: any_yes needs a list of question ids")
+                q_ids = []
+            for q_id in q_ids:
+                if q_types.get(q_id) != "choice":
+                    errors.append(f"{r_where}: {q_id!r} is not a choice question")
+        elif kind == "any_answer":
+            q_ids = rule["any_answer"]
+            if not isinstance(q_ids, list) or not q_ids:
+                errors.append(f"{r_where}: any_answer needs a list of question ids")
+                q_ids = []
+            for q_id in q_ids:
+                if q_id not in q_types:
+                    errors.append(f"{r_where}: {q_id!r} is not a follow-up question")
+        elif kind == "number":
+            if q_types.get(rule["number"]) != "number":
+                errors.append(f"{r_where}: {rule['number']!r} is not a number question")
+            if not isinstance(rule.get("at_least"), int):
+                errors.append(f"{r_where}: number rules need an int at_least")
+        else:
+            errors.append(f"{r_where}: needs exactly one of {', '.join(_RULE_CHECKS)}")
+        errors.extend(_check_outcome(r_where, rule))
+    return errors
+
+
+# -------------------------
+# Compiled knowledge base artifact
+# header: magic, format version, payload length, sha256(payload)
+# payload: pickle of conditions + prebuilt matching structures, with all
+# strings interned so every distinct string is stored once. Only plain
+# containers and scalars are unpickled (no classes or functions), so an
+# artifact cannot run code on load; the checksum only catches corruption.
+# -------------------------
+ARTIFACT_FORMAT = 7
+_ARTIFACT_MAGIC = b"MBXKB\0"
+_ARTIFACT_HEADER = struct.Struct("<6sHQ32s")
+
+
+def _intern(obj):
+    if isinstance(obj, str):
+        return sys.intern(obj)
+    if isinstance(obj, list):
+        return [_intern(x) for x in obj]
+    if isinstance(obj, dict):
+        return {_intern(k): _intern(v) for k, v in obj.items()}
+    return obj
+
+
+def conditions_hash(conditions: list) -> str:
+    """Content hash of a condition list, to tell whether an artifact is stale."""
+    payload = json.dumps(conditions, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    scored = []
-    for item in CONDITIONS:
-        score = keyword_match_score(text, item["keywords"])
-        if score > 0:
-            scored.append((score, item))
 
+def compile_knowledge_base(conditions: list, path: str, source: str = "") -> dict:
+    """Validate conditions and write them with their matching structures to path."""
+    validate_conditions(conditions)
+    source_hash = conditions_hash(conditions)
+    conditions = _intern(conditions)
+    kb = build_knowledge_base(conditions, 1)
+
+    payload = pickle.dumps({
+        "format": ARTIFACT_FORMAT,
+        "source": source,
+        "source_hash": source_hash,
+        "conditions": conditions,
+        "automaton": kb["automaton"].state(),
+        "token_index": kb["token_index"],
+        "fuzzy_index": dict(kb["fuzzy_index"], cache={}),
+        "lemma_index": kb["lemma_index"],
+    }, protocol=5)
+    header = _ARTIFACT_HEADER.pack(
+        _ARTIFACT_MAGIC, ARTIFACT_FORMAT, len(payload), hashlib.sha256(payload).digest()
+    )
+
+    # write then rename, so readers never see a half-written artifact
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+    return {
+        "path": path,
+        "conditions": len(conditions),
+        "keywords": len(kb["automaton"].keywords),
+        "bytes": len(header) + len(payload),
+    }
+
+
+class _DataUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"artifact references {module}.{name}; only plain data is allowed")
+
+
+def read_artifact(path: str) -> dict:
+    """Load a compiled knowledge base. Raises ValueError if unusable."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _ARTIFACT_HEADER.size:
+        raise ValueError(f"{path}: truncated artifact")
+    magic, fmt, length, digest = _ARTIFACT_HEADER.unpack_from(data)
+    if magic != _ARTIFACT_MAGIC:
+        raise ValueError(f"{path}: not a knowledge base artifact")
+    if fmt != ARTIFACT_FORMAT:
+        raise ValueError(f"{path}: artifact format {fmt}, expected {ARTIFACT_FORMAT}")
+
+    payload = memoryview(data)[_ARTIFACT_HEADER.size:]
+    if len(payload) != length or hashlib.sha256(payload).digest() != digest:
+        raise ValueError(f"{path}: checksum mismatch")
+    return _DataUnpickler(io.BytesIO(payload)).load()
+
+
+KB_ARTIFACT = os.environ.get(
+    "MEDIBOTX_KB_ARTIFACT",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "conditions.kb"),
+)
+
+# the literal above, kept as the default compile source
+_BUILTIN_CONDITIONS = CONDITIONS
+
+
+def _initial_kb() -> dict:
+    global CONDITIONS
+    # a mistyped question id in the literal fails here, not silently later
+    validate_conditions(_BUILTIN_CONDITIONS)
+    if os.path.exists(KB_ARTIFACT):
+        try:
+            compiled = read_artifact(KB_ARTIFACT)
+        except (OSError, ValueError, pickle.UnpicklingError) as e:
+            warnings.warn(f"Ignoring knowledge base artifact: {e}")
+        else:
+            if compiled["source"] == "rules.py" and compiled["source_hash"] != conditions_hash(_BUILTIN_CONDITIONS):
+                # compiled from an older version of the literal above
+                warnings.warn(f"Ignoring knowledge base artifact {KB_ARTIFACT}: CONDITIONS in rules.py "
+                              "changed since it was compiled (python -m rules compile)")
+                return build_knowledge_base(CONDITIONS, 1)
+            CONDITIONS = compiled["conditions"]
+            return build_knowledge_base(CONDITIONS, 1, compiled)
+    return build_knowledge_base(CONDITIONS, 1)
+
+
+_KB = _initial_kb()
+_KB_LOCK = threading.Lock()
+
+
+def kb_version() -> int:
+    return _KB["version"]
+
+
+def _swap_kb(conditions: list, compiled: dict = None) -> int:
+    global _KB, CONDITIONS
+    # reloading identical content keeps the version (a watcher may see
+    # the same file again). Versions are counted per process; service.py
+    # compares source_hash to match its workers' versions to its own
+    source_hash = compiled["source_hash"] if compiled else conditions_hash(conditions)
+    if source_hash == _KB["source_hash"]:
+        return _KB["version"]
+
+    # build outside the lock; readers never take it, they just pick up
+    # whichever snapshot _KB points to when they start
+    kb = build_knowledge_base(conditions, None, compiled)
+    with _KB_LOCK:
+        kb["version"] = _KB["version"] + 1
+        _KB = kb
+        CONDITIONS = conditions
+    RESULT_CACHE.clear()
+    return kb["version"]
+
+
+def load_conditions(conditions: list) -> int:
+    """Replace the knowledge base and invalidate cached results. Returns the new version
+    (unchanged when the conditions are identical to the current ones)."""
+    validate_conditions(conditions)
+    return _swap_kb(conditions)
+
+
+def load_knowledge_base_file(path: str) -> int:
+    """Load a JSON list of conditions or a compiled artifact. Returns the new version."""
+    with open(path, "rb") as f:
+        is_artifact = f.read(len(_ARTIFACT_MAGIC)) == _ARTIFACT_MAGIC
+
+    if is_artifact:
+        # validated when it was compiled
+        compiled = read_artifact(path)
+        return _swap_kb(compiled["conditions"], compiled)
+
+    with open(path, encoding="utf-8") as f:
+        return load_conditions(json.load(f))
+
+
+class KnowledgeBaseWatcher:
+    """
+    Hot reload: polls a knowledge base file (JSON or compiled artifact)
+    and swaps it in from a background thread whenever it changes.
+    A file that fails to load is reported and the current KB is kept.
+    """
+
+    def __init__(self, path: str, interval: float = 2.0):
+        self.path = path
+        self.interval = interval
+        self.last_error = None
+        self._stamp = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self) -> bool:
+        """Reload if the file changed since the last check. Returns True on reload."""
+        try:
+            st = os.stat(self.path)
+        except OSError as e:
+            self.last_error = str(e)
+            return False
+
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return False
+        self._stamp = stamp
+
+        try:
+            load_knowledge_base_file(self.path)
+        except (OSError, ValueError, pickle.UnpicklingError) as e:
+            self.last_error = str(e)
+            warnings.warn(f"Knowledge base reload failed, keeping version {kb_version()}: {e}")
+            return False
+
+        self.last_error = None
+        return True
+
+    def start(self):
+        # first load is synchronous so callers start on the file's KB
+        self.check()
+        self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+
+# -------------------------
+# Result cache
+# -------------------------
+class ResultCache:
+    """
+    Thread-safe bounded LRU cache of analyze_symptoms results.
+    Keys are (KB version, preprocessed text), so results from an older
+    knowledge base are never served. maxsize=0 disables caching.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if self.maxsize <= 0:
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize: int):
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def _evict(self):
+        while len(self._data) > max(self.maxsize, 0):
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+RESULT_CACHE = ResultCache(int(os.environ.get("MEDIBOTX_RESULT_CACHE_SIZE", "1024")))
+
+
+# -------------------------
+# Ranking backend
+# MEDIBOTX_RANKER=model ranks with the linear model from ranker.py
+# (python ranker.py train); the keyword rules stay the fallback when the
+# model cannot be loaded or is unsure about a text. As with the rules, a
+# High severity condition needs one of its keywords matched as written.
+# -------------------------
+RANKER = os.environ.get("MEDIBOTX_RANKER", "rules")
+RANKER_MODEL = os.environ.get(
+    "MEDIBOTX_RANKER_MODEL",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ranker.json"),
+)
+_RANKERS = {}   # model path -> TextRanker, or None if it failed to load
+
+
+def get_ranker():
+    """The model ranker when selected and loadable, else None. Loaded once per process."""
+    if RANKER != "model":
+        return None
+    if RANKER_MODEL not in _RANKERS:
+        try:
+            import ranker
+            _RANKERS[RANKER_MODEL] = ranker.load(RANKER_MODEL)
+        except Exception as e:
+            # a broken model file must not break analysis: fall back for good
+            warnings.warn(f"Model ranker unavailable, using the keyword rules: {type(e).__name__}: {e}")
+            _RANKERS[RANKER_MODEL] = None
+    return _RANKERS[RANKER_MODEL]
+
+
+def _with_exact_evidence(kb: dict, top: list, exact_ids: set) -> list:
+    """Model picks minus needs_exact conditions none of exact_ids (keyword ids) belong to."""
+    postings = kb["automaton"].postings
+    evidence = {idx for pid in exact_ids for idx, _ in postings[pid]}
+    return [idx for idx in top if idx not in kb["needs_exact"] or idx in evidence]
+
+
+# -------------------------
+# Main Analyzer
+# -------------------------
+def _build_result(top_matches: list) -> dict:
+    """Result dict for the top matching conditions (best first)."""
     # No match
-    if not scored:
+    if not top_matches:
         return {
             "condition": "Unidentified Symptoms",
             "severity": "Low",
@@ -275,19 +1503,13 @@ def analyze_symptoms(user_text: str):
             "condition_id": None,
         }
 
-    # Sort by score (desc)
-    scored.sort(key=lambda x: x[0], reverse=True)
-
-    # Get top 3 to show possible conditions
-    top_matches = scored[:3]
-
     # ✅ Pick the most critical severity among top matches (priority to High)
-    chosen = top_matches[0][1]
-    for _, item in top_matches:
+    chosen = top_matches[0]
+    for item in top_matches:
         if SEVERITY_RANK[item["severity"]] > SEVERITY_RANK[chosen["severity"]]:
             chosen = item
 
-    possible_conditions = [m[1]["condition"] for m in top_matches]
+    possible_conditions = [item["condition"] for item in top_matches]
 
     return {
         "condition": chosen["condition"],
@@ -301,89 +1523,478 @@ def analyze_symptoms(user_text: str):
     }
 
 
+def _analyze(kb: dict, text: str, tokens: list) -> dict:
+    conditions = kb["conditions"]
+
+    model = get_ranker()
+    if model is not None:
+        with metrics.timer("model_ranking"):
+            top = model.rank([tokens], kb)[0]
+            if kb["needs_exact"].intersection(top):
+                matched, fuzzy = match_keywords(kb, text, tokens)
+                top = _with_exact_evidence(kb, top, matched - fuzzy)
+        if top:
+            metrics.inc("medibotx_ranker_total", backend="model")
+            return _build_result([conditions[idx] for idx in top])
+        metrics.inc("medibotx_ranker_total", backend="rules")
+
+    # Only conditions sharing a token with the input can score; the
+    # automaton is not run at all when there are none.
+    # Keywords found only after typo correction count FUZZY_WEIGHT.
+    # Top 3 by score (desc), ties in knowledge-base order as before.
+    top = []
+    with metrics.timer("keyword_scoring"):
+        matched, fuzzy = match_keywords(kb, text, tokens)
+    if fuzzy:
+        metrics.inc("medibotx_fuzzy_matches_total")
+    with metrics.timer("ranking"):
+        if matched:
+            top = kb["automaton"].rank(matched, 3, fuzzy, FUZZY_WEIGHT, kb["needs_exact"])
+        return _build_result([conditions[idx] for idx in top])
+
+
+def count_result_metrics(result: dict):
+    metrics.inc("medibotx_analyze_total")
+    metrics.inc("medibotx_severity_total", severity=result["severity"])
+    if result["condition_id"] is None:
+        metrics.inc("medibotx_unidentified_total")
+    else:
+        metrics.inc("medibotx_condition_matches_total", condition=result["condition_id"])
+
+
+def analyze_symptoms(user_text: str):
+    with metrics.timer("preprocess"):
+        text, tokens, _ = tokenize(user_text)
+    kb = _KB
+
+    key = (kb["version"], text)
+    result = RESULT_CACHE.get(key)
+    if result is None:
+        result = _analyze(kb, text, tokens)
+        RESULT_CACHE.put(key, result)
+        metrics.inc("medibotx_result_cache_total", result="miss")
+    else:
+        metrics.inc("medibotx_result_cache_total", result="hit")
+    count_result_metrics(result)
+
+    # callers get their own dict; the cached one stays untouched
+    return dict(result)
+
+
+def analyze_symptoms_batch(texts, kb: dict = None) -> list:
+    """
+    Vectorized analyze_symptoms for many texts (offline re-triage):
+    - each distinct normalized text is scanned once into a sparse
+      document x keyword matrix
+    - one sparse product with the keyword x condition weights scores
+      every document
+    Returns the same dicts as analyze_symptoms, in input order.
+    kb defaults to the current snapshot.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    kb = kb or _KB
+    automaton, conditions = kb["automaton"], kb["conditions"]
+
+    rows = {}       # normalized text -> document row
+    row_tokens = []  # document row -> tokens
+    doc_rows = []   # input position -> document row
+    indptr = [0]
+    indices = []
+    values = []     # 1, or FUZZY_WEIGHT for keywords found after correction
+    exact = []      # 1, or 0 for keywords found after correction
+    model = get_ranker()
+    row_exact = []  # document row -> keyword ids matched as written (for the model)
+    for user_text in texts:
+        text, tokens, _ = tokenize(user_text)
+        row = rows.get(text)
+        if row is None:
+            row = rows[text] = len(rows)
+            row_tokens.append(tokens)
+            matched, fuzzy = match_keywords(kb, text, tokens)
+            for pid in matched:
+                indices.append(pid)
+                values.append(FUZZY_WEIGHT if pid in fuzzy else 1)
+                exact.append(0 if pid in fuzzy else 1)
+            indptr.append(len(indices))
+            if model is not None:
+                row_exact.append(matched - fuzzy)
+        doc_rows.append(row)
+
+    docs = sparse.csr_matrix(
+        (np.array(values, dtype=np.float64), indices, indptr),
+        shape=(len(rows), len(automaton.keywords)),
+    )
+    scores = (docs @ automaton.weight_matrix()).tocsr()
+
+    if kb["needs_exact"] and not all(exact) and scores.nnz:
+        # drop needs_exact conditions that only corrected keywords reached
+        evidence = sparse.csr_matrix((np.array(exact, dtype=np.float64), indices, indptr), shape=docs.shape)
+        evidence = (evidence @ automaton.weight_matrix()).tocsr()
+        needs_exact = np.zeros(len(conditions), dtype=bool)
+        needs_exact[list(kb["needs_exact"])] = True
+        row_ids = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+        drop = needs_exact[scores.indices] & (np.asarray(evidence[row_ids, scores.indices]).ravel() == 0)
+        scores.data[drop] = 0
+        scores.eliminate_zeros()
+
+    # order each row by score (desc), ties in knowledge-base order
+    row_ids = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+    ranked = scores.indices[np.lexsort((scores.indices, -scores.data, row_ids))]
+
+    results = []
+    for row in range(scores.shape[0]):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        top = ranked[start:min(end, start + 3)]
+        results.append(_build_result([conditions[idx] for idx in top]))
+
+    # the model answers for every text it is sure about, in one batch
+    if model is not None:
+        with metrics.timer("model_ranking"):
+            ranked = model.rank(row_tokens, kb)
+        for row, top in enumerate(ranked):
+            if kb["needs_exact"].intersection(top):
+                top = _with_exact_evidence(kb, top, row_exact[row])
+            if top:
+                results[row] = _build_result([conditions[idx] for idx in top])
+
+    return [dict(results[row]) for row in doc_rows]
+
+
+# -------------------------
+# As-you-type analysis
+# -------------------------
+def _common_prefix(a: str, b: str) -> int:
+    """Length of the common prefix of a and b."""
+    if b.startswith(a):
+        return len(a)
+    # binary search over C-level compares instead of a per-character loop
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if b.startswith(a[:mid]):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class IncrementalAnalyzer:
+    """
+    Live suggestions while symptoms are typed. update(text) returns what
+    analyze_symptoms(text) returns with the keyword rules (the model
+    ranker, result cache and metrics are left to the final analysis),
+    resuming from the previous text instead of starting over:
+    - per token: automaton states after it and the keyword ids that end
+      in it, for the exact, inflection-mapped and typo-corrected text
+    - per keyword: how many tokens matched it
+    - per condition: score of the keywords currently matched
+    Tokens before the first edited character are kept; only the rest of
+    the text is tokenized and scanned, so typing at the end costs about
+    one token per call. One instance per input box (not thread-safe).
+    """
+
+    def __init__(self, k: int = 3):
+        self.k = k
+        self.reset()
+
+    def reset(self):
+        self.kb = None
+        self.text = ""
+        self.result = _build_result([])
+        self._ends = []     # token -> end offset in text
+        self._steps = []    # token -> (states, matched ids, fuzzy ids)
+        self._hits = {}     # keyword id -> [tokens matching it, tokens matching after typo correction]
+        self._exact = 0     # keywords matched without correction
+        self._scores = {}   # condition index -> [exact weight, fuzzy weight]
+
+    def update(self, user_text: str) -> dict:
+        kb = _KB
+        if kb is not self.kb:
+            # knowledge base reloaded: nothing carries over
+            self.reset()
+            self.kb = kb
+        if user_text == self.text:
+            return dict(self.result)
+
+        with metrics.timer("incremental_analysis"):
+            # a token is final once two unchanged characters follow it
+            # (a single one could be an apostrophe: "can'" -> "can't")
+            keep = bisect.bisect_right(self._ends, _common_prefix(self.text, user_text) - 2)
+            while len(self._steps) > keep:
+                _, matched, fuzzy = self._steps.pop()
+                self._ends.pop()
+                self._count(matched, fuzzy, -1)
+
+            start = self._ends[-1] if self._ends else 0
+            _, tokens, spans = tokenize(user_text[start:], offsets=True)
+            for tok, (_, end) in zip(tokens, spans):
+                self._step(tok)
+                self._ends.append(start + end)
+
+            self.text = user_text
+            self.result = _build_result([kb["conditions"][idx] for idx in self._top()])
+        return dict(self.result)
+
+    def _step(self, tok: str):
+        kb = self.kb
+        automaton = kb["automaton"]
+        states = self._steps[-1][0] if self._steps else (0, 0, 0)
+        lead = " " if self._steps else ""
+
+        # the same three texts match_keywords looks at
+        lemma = kb["lemma_index"]["table"].get(tok, tok)
+        fixed = corrected_token(lemma, kb["fuzzy_index"]) or lemma
+        exact_state, matched = automaton.resume(states[0], lead + tok)
+        lemma_state, mapped = automaton.resume(states[1], lead + lemma)
+        fixed_state, fuzzy = automaton.resume(states[2], lead + fixed)
+
+        matched |= mapped
+        self._steps.append(((exact_state, lemma_state, fixed_state), matched, fuzzy))
+        self._count(matched, fuzzy, 1)
+
+    def _count(self, matched: set, fuzzy: set, step: int):
+        postings = self.kb["automaton"].postings
+        for pid in matched | fuzzy:
+            hits = self._hits.setdefault(pid, [0, 0])
+            before = 1 if hits[0] else 2 if hits[1] else 0
+            hits[0] += step * (pid in matched)
+            hits[1] += step * (pid in fuzzy)
+            after = 1 if hits[0] else 2 if hits[1] else 0
+            if not (hits[0] or hits[1]):
+                del self._hits[pid]
+            if before == after:
+                continue
+            self._exact += (after == 1) - (before == 1)
+
+            # keyword moved between unmatched (0), matched (1) and fuzzy-only (2)
+            for idx, weight in postings[pid]:
+                score = self._scores.setdefault(idx, [0, 0])
+                if before:
+                    score[before - 1] -= weight
+                if after:
+                    score[after - 1] += weight
+                if score == [0, 0]:
+                    del self._scores[idx]
+
+    def _top(self) -> list:
+        """Indexes of the k best conditions, like KeywordAutomaton.rank."""
+        if not self._exact:
+            # corrected keywords alone (see match_keywords)
+            return []
+        needs_exact = self.kb["needs_exact"]
+        best = heapq.nlargest(
+            self.k, ((idx, score) for idx, score in self._scores.items() if score[0] or idx not in needs_exact),
+            key=lambda item: (item[1][0] + item[1][1] * FUZZY_WEIGHT, -item[0]),
+        )
+        return [idx for idx, _ in best]
+
+
 # -------------------------
 # Follow-up evaluator
-# answers_dict is {"question": answer}
+# answers_dict is {"question id": answer}; question text is still
+# accepted as a key for older callers
 # -------------------------
 def evaluate_followup(condition_id: str, answers_dict: dict):
-    final_severity = "Low"
-    final_advice = "Monitor symptoms and consult a doctor if they worsen."
+    with metrics.timer("evaluate_followup"):
+        kb = _KB
+        table = kb["followup"].get(condition_id)
 
-    # Helper: safely read choice answers
-    def ans_yes(q):
-        return str(answers_dict.get(q, "")).strip().lower() == "yes"
+        outcome = FOLLOWUP_DEFAULT
+        if table:
+            questions = table["questions"]
+            answers = {questions.get(k, k): v for k, v in answers_dict.items()}
 
-    # Helper: safely read number answers
-    def ans_num(q):
-        try:
-            return int(answers_dict.get(q, 0))
-        except:
-            return 0
-
-    # ✅ HEART
-    if condition_id == "heart":
-        if any(answers_dict.values()):
-            final_severity = "High"
-            final_advice = "Chest pain with risk signs needs emergency care. Call emergency services immediately."
-        else:
-            final_severity = "Medium"
-            final_advice = "Chest discomfort should not be ignored. Consult a doctor soon."
-
-    # ✅ BREATHING
-    elif condition_id == "breathing":
-        if "yes" in [str(v).lower() for v in answers_dict.values()]:
-            final_severity = "High"
-            final_advice = "Breathing difficulty may be serious. Seek urgent medical attention immediately."
-        else:
-            final_severity = "Medium"
-            final_advice = "If breathing discomfort continues, consult a doctor and avoid exertion."
+            # first matching rule wins
+            outcome = table["otherwise"]
+            for check, rule in table["rules"]:
+                if check(rule, answers):
+                    outcome = rule
+                    break
 
-    # ✅ VIRAL FEVER
-    elif condition_id == "viral":
-        days_q = "How many days have you had fever?"
-        days = ans_num(days_q)
+    # unknown ids come from clients; keep the label set bounded
+    label = condition_id if condition_id in kb["positions"] else "other"
+    metrics.inc("medibotx_followup_total", condition=label, final_severity=outcome["severity"])
+    return {
+        "final_severity": outcome["severity"],
+        "final_advice": outcome["advice"],
+    }
 
-        if days >= 3:
-            final_severity = "Medium"
-            final_advice = "Fever lasting 3+ days needs doctor consultation and testing if required."
-        else:
-            final_severity = "Low"
-            final_advice = "Rest, fluids, and monitor temperature."
 
-    # ✅ FOOD POISONING
-    elif condition_id == "food_poisoning":
-        count_q = "How many times did you vomit or have loose motions today?"
-        count = ans_num(count_q)
+# -------------------------
+# Bulk triage: python -m rules triage
+# -------------------------
+def _record_text(record, field: str):
+    """(text, None) for a usable record, else (None, why it was skipped)."""
+    if not isinstance(record, dict):
+        return None, f"expected an object, got {type(record).__name__}"
+    if field not in record:
+        return None, f"no {field!r} field"
+    text = record[field]
+    if not isinstance(text, str):
+        return None, f"{field!r} is {type(text).__name__}, not a string"
+    return text, None
 
-        if count >= 6:
-            final_severity = "High"
-            final_advice = "High risk of dehydration. Seek medical help quickly and continue ORS if possible."
-        else:
-            final_severity = "Medium"
-            final_advice = "Take ORS, rest, and eat bland food. Consult a doctor if symptoms persist."
 
-    # ✅ STOMACH
-    elif condition_id == "stomach":
-        pain_q = "Rate your stomach pain from 1 to 10"
-        pain = ans_num(pain_q)
+def _read_texts(stream, fmt: str, field: str, skip):
+    """
+    Texts of a CSV/JSONL/JSON/text input. A missing column (CSV) or a
+    first record without the field (JSON) raises ValueError; other bad
+    records are passed to skip(where, reason) and left out.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        if field not in (reader.fieldnames or ()):
+            raise ValueError(f"no {field!r} column in the CSV header {reader.fieldnames} (see --field)")
+        for row in reader:
+            if row[field] is None:
+                skip(f"line {reader.line_num}", f"no value for {field!r}")
+            else:
+                yield row[field]
+        return
 
-        if pain >= 7:
-            final_severity = "Medium"
-            final_advice = "Severe stomach pain should be checked by a doctor soon."
-        else:
-            final_severity = "Low"
-            final_advice = "Light diet + hydration. Avoid spicy/oily meals."
-
-    # ✅ UTI
-    elif condition_id == "uti":
-        if "yes" in [str(v).lower() for v in answers_dict.values()]:
-            final_severity = "Medium"
-            final_advice = "UTI symptoms with fever/back pain need doctor evaluation soon."
+    if fmt in ("jsonl", "json"):
+        if fmt == "json":
+            # one array, read whole (use JSONL to stream large inputs)
+            records = json.load(stream)
+            if not isinstance(records, list):
+                raise ValueError("a .json input must be an array of objects (or use JSONL)")
+            numbered = ((f"item {i}", record) for i, record in enumerate(records, 1))
         else:
-            final_severity = "Low"
-            final_advice = "Drink water and monitor. Consult doctor if burning continues."
+            numbered = ((f"line {i}", line) for i, line in enumerate(stream, 1) if line.strip())
 
-    return {
-        "final_severity": final_severity,
-        "final_advice": final_advice,
-    }
+        first = True
+        for where, record in numbered:
+            if fmt == "jsonl":
+                try:
+                    record = json.loads(record)
+                except ValueError as e:
+                    skip(where, f"invalid JSON ({e})")
+                    continue
+            text, reason = _record_text(record, field)
+            if first and isinstance(record, dict) and field not in record:
+                # most likely the wrong field name rather than one bad record
+                raise ValueError(f"{where}: no {field!r} field in {sorted(record)} (see --field)")
+            first = False
+            if reason:
+                skip(where, reason)
+            else:
+                yield text
+        return
+
+    for line in stream:
+        yield line.rstrip("\r\n")
+
+
+def _chunks(items, size: int):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _triage_chunk(texts: list) -> list:
+    # runs in a worker process; results are serialized there too
+    results = analyze_symptoms_batch(texts)
+    return [json.dumps({"symptoms": t, **r}) for t, r in zip(texts, results)]
+
+
+def triage_stream(texts, workers: int = None, chunk_size: int = 1000):
+    """
+    Yield one JSON line per input text, in input order.
+    Texts are fanned out to a process pool in chunks; at most two chunks
+    per worker are in flight, so memory stays flat for any input size.
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in _chunks(texts, chunk_size):
+            pending.append(pool.submit(_triage_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _cmd_triage(args) -> int:
+    fmt = args.format
+    if fmt is None:
+        ext = os.path.splitext(args.input)[1].lower()
+        fmt = {".csv": "csv", ".jsonl": "jsonl", ".json": "json"}.get(ext, "txt")
+
+    skipped = []
+
+    def skip(where, reason):
+        skipped.append(where)
+        print(f"{args.input}: {where}: {reason}, skipped", file=sys.stderr)
+
+    src = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        texts = _read_texts(src, fmt, args.field, skip)
+        for line in triage_stream(texts, args.workers, args.chunk_size):
+            dst.write(line + "\n")
+    except ValueError as e:
+        print(f"{args.input}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    if skipped:
+        print(f"{args.input}: {len(skipped)} records skipped", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _cmd_compile(args) -> int:
+    if args.source:
+        with open(args.source, encoding="utf-8") as f:
+            conditions = json.load(f)
+    else:
+        conditions = _BUILTIN_CONDITIONS
+
+    try:
+        summary = compile_knowledge_base(conditions, args.output, source=args.source or "rules.py")
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(json.dumps(summary))
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m rules", description="MediBotX rules engine")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("triage", help="bulk-triage symptom texts to JSON lines",
+                       description="Bad records are reported on stderr and skipped (exit status 1).")
+    p.add_argument("input", nargs="?", default="-", help="CSV/JSONL/text file, '-' for stdin")
+    p.add_argument("-o", "--output", default="-", help="output JSONL file, '-' for stdout")
+    p.add_argument("--format", choices=["csv", "jsonl", "json", "txt"],
+                   help="input format (default: from extension, one text per line otherwise); "
+                        "json is an array, read whole")
+    p.add_argument("--field", default="symptoms", help="CSV column / JSON field holding the text")
+    p.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    p.add_argument("--chunk-size", type=int, default=1000, help="texts per worker task")
+
+    p = sub.add_parser("compile", help="validate the knowledge base and write a compiled artifact")
+    p.add_argument("--source", help="JSON list of conditions (default: CONDITIONS in rules.py)")
+    p.add_argument("-o", "--output", default=KB_ARTIFACT, help="artifact path (default: %(default)s)")
+
+    args = parser.parse_args(argv)
+    if args.command == "triage":
+        return _cmd_triage(args)
+    if args.command == "compile":
+        return _cmd_compile(args)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
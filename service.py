@@ -0,0 +1,330 @@
+"""
+Standalone async JSON triage service.
+
+    python service.py --port 8080 --workers 4
+
+Endpoints:
+- POST /analyze   {"symptoms": "..."}                  -> analyze_symptoms result
+- POST /followup  {"condition_id": "...", "answers": {}} -> evaluate_followup result
+  (both accept an optional "session" id for the audit log, see --audit-log)
+- GET  /health    -> {"status": "ok", "kb_version": n}
+- GET  /metrics   -> Prometheus text
+
+Analyze requests arriving within --batch-window-ms of each other are
+coalesced into one analyze_symptoms_batch call on a process pool.
+SIGINT/SIGTERM stop accepting connections, finish in-flight requests
+and drain the pending batch before exiting.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import audit
+import metrics
+import rules
+
+MAX_BODY = 1024 * 1024
+
+# metric label values; anything else a client sends is counted as "other"
+ENDPOINTS = ("/analyze", "/followup", "/health", "/metrics")
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# -------------------------
+# Micro-batching
+# -------------------------
+def _watch_kb_file():
+    # the server and its worker processes all follow the same hot-reload file
+    path = os.environ.get("MEDIBOTX_KB_FILE")
+    if path:
+        return rules.KnowledgeBaseWatcher(path).start()
+    return None
+
+
+def _score_batch(texts: list, source_hash: str, version: int):
+    """
+    Runs in a worker. Workers count KB versions on their own (a worker
+    started after a reload numbers it differently), so the batch reports
+    the server's version for the server's KB content, and None while the
+    worker is on other content (mid-reload).
+    """
+    kb = rules._KB
+    results = rules.analyze_symptoms_batch(texts, kb)
+    return (version if kb["source_hash"] == source_hash else None), results
+
+
+class MicroBatcher:
+    """
+    Collects texts for up to `window` seconds (or max_batch texts) and
+    scores them with one analyze_symptoms_batch call in the executor.
+    """
+
+    def __init__(self, executor, window: float = 0.005, max_batch: int = 256):
+        self.executor = executor
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []    # (text, future)
+        self._timer = None
+        self._inflight = set()
+
+    async def submit(self, text: str):
+        """Returns (result, version of the KB that scored it; None if not the server's current one)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch: list):
+        metrics.inc("medibotx_service_batches_total")
+        metrics.inc("medibotx_service_batched_requests_total", len(batch))
+        loop = asyncio.get_running_loop()
+        kb = rules._KB
+        try:
+            with metrics.timer("service_batch"):
+                version, results = await loop.run_in_executor(
+                    self.executor, _score_batch, [text for text, _ in batch], kb["source_hash"], kb["version"]
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            rules.count_result_metrics(result)
+            if not future.done():
+                future.set_result((result, version))
+
+    async def drain(self):
+        self._flush()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+
+# -------------------------
+# HTTP
+# -------------------------
+class TriageService:
+    def __init__(self, workers: int = None, window: float = 0.005, max_batch: int = 256,
+                 shutdown_grace: float = 10.0):
+        self.executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                            initializer=_watch_kb_file)
+        self.batcher = MicroBatcher(self.executor, window, max_batch)
+        self.shutdown_grace = shutdown_grace
+        self.closing = False
+        self._server = None
+        self._connections = set()
+        self._active_requests = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def dispatch(self, method: str, path: str, body: bytes):
+        path = path.split("?")[0]
+
+        if path == "/health":
+            return 200, {"status": "closing" if self.closing else "ok", "kb_version": rules.kb_version()}
+        if path == "/metrics":
+            return 200, metrics.get_collector().render()
+        if path not in ("/analyze", "/followup"):
+            raise HTTPError(404, f"unknown endpoint {path}")
+        if method != "POST":
+            raise HTTPError(405, "use POST")
+        if self.closing:
+            raise HTTPError(503, "shutting down")
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "body must be JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "body must be a JSON object")
+
+        # optional caller-supplied id, recorded in the audit log
+        session = payload.get("session")
+        if not isinstance(session, (str, type(None))):
+            raise HTTPError(400, "'session' must be a string")
+
+        if path == "/analyze":
+            symptoms = payload.get("symptoms")
+            if not isinstance(symptoms, str):
+                raise HTTPError(400, "'symptoms' must be a string")
+            result, version = await self.batcher.submit(symptoms)
+            audit.analyze(session, symptoms, result, version)
+            return 200, result
+
+        answers = payload.get("answers", {})
+        condition_id = payload.get("condition_id")
+        if not isinstance(answers, dict) or not isinstance(condition_id, (str, type(None))):
+            raise HTTPError(400, "expected 'condition_id' (string) and 'answers' (object)")
+        final = rules.evaluate_followup(condition_id, answers)
+        audit.followup(session, condition_id, answers, final)
+        return 200, final
+
+    async def _handle_request(self, reader, writer) -> bool:
+        """Serve one request; returns False when the connection should close."""
+        request_line = await reader.readline()
+        if not request_line:
+            return False
+
+        self._active_requests += 1
+        self._idle.clear()
+        try:
+            method, path, version = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            try:
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    raise HTTPError(413, "body too large")
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.dispatch(method, path, body)
+            except HTTPError as e:
+                status, payload = e.status, {"error": str(e)}
+                keep_alive = keep_alive and e.status != 413
+            except Exception as e:
+                status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+            endpoint = path.split("?")[0]
+            metrics.inc("medibotx_service_requests_total",
+                        endpoint=endpoint if endpoint in ENDPOINTS else "other", status=status)
+            keep_alive = keep_alive and not self.closing
+            self._write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            return keep_alive
+        finally:
+            self._active_requests -= 1
+            if not self._active_requests:
+                self._idle.set()
+
+    def _write_response(self, writer, status: int, payload, keep_alive: bool):
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload).encode("utf-8")
+            content_type = "application/json"
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while await self._handle_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def start(self, host: str, port: int):
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server
+
+    async def shutdown(self):
+        """Stop accepting, finish in-flight requests, drain the batcher."""
+        self.closing = True
+        self._server.close()
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.shutdown_grace)
+        except asyncio.TimeoutError:
+            pass
+        await self.batcher.drain()
+
+        # whatever is left is idle keep-alive connections
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self.executor.shutdown(wait=True)
+        audit.close()
+
+
+async def serve(args):
+    if args.audit_log:
+        audit.configure(args.audit_log, fsync=args.audit_fsync)
+    # /followup and /health are served from this process's KB
+    watcher = _watch_kb_file()
+    service = TriageService(args.workers, args.batch_window_ms / 1000, args.max_batch)
+    await service.start(args.host, args.port)
+    print(f"MediBotX triage service on http://{args.host}:{args.port}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+
+    try:
+        await stop.wait()
+    finally:
+        await service.shutdown()
+        if watcher is not None:
+            watcher.stop()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="MediBotX async JSON triage service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None, help="scoring processes (default: CPU count)")
+    parser.add_argument("--batch-window-ms", type=float, default=5.0,
+                        help="how long to wait for more analyze requests before scoring")
+    parser.add_argument("--max-batch", type=int, default=256, help="score early once this many are waiting")
+    parser.add_argument("--audit-log", default=audit.AUDIT_LOG,
+                        help="record every analysis and follow-up to this JSONL or .db file")
+    parser.add_argument("--audit-fsync", choices=audit.FSYNC_POLICIES, default=audit.FSYNC)
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
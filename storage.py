@@ -0,0 +1,179 @@
+"""
+Persistent case history backed by SQLite.
+
+Writes are buffered and committed in batches (one transaction per
+flush). Counts and pages add the session's still-buffered cases to what
+is on disk, so a session sees its own cases without forcing a flush;
+only full exports (all, iter_cases) flush first.
+Pages are fetched with LIMIT/OFFSET on an index, so only the visible
+page is ever loaded.
+"""
+import atexit
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    symptoms TEXT NOT NULL,
+    condition TEXT NOT NULL,
+    condition_id TEXT,
+    severity TEXT NOT NULL,
+    advice TEXT NOT NULL,
+    time TEXT NOT NULL,
+    final_severity TEXT,
+    final_advice TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_cases_session ON cases (session_id, id);
+CREATE INDEX IF NOT EXISTS idx_cases_severity ON cases (severity);
+"""
+
+COLUMNS = (
+    "symptoms", "condition", "condition_id", "severity", "advice",
+    "time", "final_severity", "final_advice",
+)
+
+
+class CaseStore:
+    """
+    Case history for all sessions of one server process.
+    - add_case buffers; flush writes every buffered case in one transaction
+    - a background thread flushes every flush_interval seconds
+    """
+
+    def __init__(self, path: str, batch_size: int = 50, flush_interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._pending = []
+        self._changes = {}   # session_id -> adds/clears, see version()
+
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(flush_interval,),
+                                        name="case-store-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # -------------------------
+    # Writes
+    # -------------------------
+    def add_case(self, session_id: str, case: dict):
+        row = (session_id,) + tuple(case.get(col) for col in COLUMNS)
+        with self._lock:
+            self._pending.append(row)
+            self._changes[session_id] = self._changes.get(session_id, 0) + 1
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT INTO cases (session_id, {', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})",
+                rows,
+            )
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._pending = [row for row in self._pending if row[0] != session_id]
+            self._changes[session_id] = self._changes.get(session_id, 0) + 1
+            with self._conn:
+                self._conn.execute("DELETE FROM cases WHERE session_id = ?", (session_id,))
+
+    # -------------------------
+    # Reads
+    # -------------------------
+    def _query(self, sql: str, params: tuple) -> list:
+        with self._lock:
+            self._flush_locked()
+            return self._conn.execute(sql, params).fetchall()
+
+    def _pending_locked(self, session_id: str) -> list:
+        # buffered cases are newer than anything on disk; oldest first
+        return [dict(zip(COLUMNS, row[1:])) for row in self._pending if row[0] == session_id]
+
+    def _count_locked(self, session_id: str) -> int:
+        stored = self._conn.execute("SELECT COUNT(*) FROM cases WHERE session_id = ?", (session_id,)).fetchone()[0]
+        return stored + len(self._pending_locked(session_id))
+
+    def count(self, session_id: str) -> int:
+        with self._lock:
+            return self._count_locked(session_id)
+
+    def version(self, session_id: str) -> tuple:
+        """(count, changes made here): changes whenever the history changes, not when it is flushed."""
+        with self._lock:
+            return self._count_locked(session_id), self._changes.get(session_id, 0)
+
+    def page(self, session_id: str, page: int, page_size: int) -> list:
+        """Cases on a page, newest first; each dict has its 1-based case number."""
+        start = page * page_size
+        with self._lock:
+            pending = self._pending_locked(session_id)[::-1]
+            total = self._count_locked(session_id)
+            cases = pending[start:start + page_size]
+            rest = page_size - len(cases)
+            if rest:
+                rows = self._conn.execute(
+                    f"SELECT {', '.join(COLUMNS)} FROM cases WHERE session_id = ? "
+                    "ORDER BY id DESC LIMIT ? OFFSET ?",
+                    (session_id, rest, max(start - len(pending), 0)),
+                ).fetchall()
+                cases += [dict(row) for row in rows]
+        first = total - start
+        return [dict(case, number=first - i) for i, case in enumerate(cases)]
+
+    def all(self, session_id: str) -> list:
+        """Every case of a session, oldest first."""
+        rows = self._query(
+            f"SELECT {', '.join(COLUMNS)} FROM cases WHERE session_id = ? ORDER BY id",
+            (session_id,),
+        )
+        return [dict(row) for row in rows]
+
+    def iter_cases(self, session_id: str, chunk_size: int = 100):
+        """Every case of a session, oldest first, in lists of chunk_size."""
+        last_id = 0
+        while True:
+            rows = self._query(
+                f"SELECT id, {', '.join(COLUMNS)} FROM cases WHERE session_id = ? AND id > ? "
+                "ORDER BY id LIMIT ?",
+                (session_id, last_id, chunk_size),
+            )
+            if not rows:
+                return
+            last_id = rows[-1]["id"]
+            yield [{col: row[col] for col in COLUMNS} for row in rows]
+            if len(rows) < chunk_size:
+                return
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+    def _run(self, interval: float):
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        with self._lock:
+            self._conn.close()
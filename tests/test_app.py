@@ -0,0 +1,51 @@
+import os
+import time
+
+import pytest
+
+import report
+from storage import CaseStore
+
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+CASE = {"symptoms": "cold and cough", "condition": "Common Cold", "condition_id": "cold",
+        "severity": "Low", "advice": "Rest.", "time": "2026-01-01 10:00:00"}
+
+
+@pytest.fixture
+def app_env(tmp_path, monkeypatch):
+    db = str(tmp_path / "cases.db")
+    monkeypatch.setenv("MEDIBOTX_DB", db)
+    monkeypatch.setenv("MEDIBOTX_REPORT_STREAM_MIN_CASES", "1")   # stream every report to a file
+    monkeypatch.setattr(report, "REPORT_DIR", str(tmp_path / "reports"))
+    return db
+
+
+def _session(user_id):
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.session_state["user_id"] = user_id
+    at.run()
+    next(b for b in at.button if "Chest Pain" in b.label).click().run()
+    for _ in range(60):
+        if at.get("download_button"):
+            return at
+        time.sleep(0.25)
+        at.run()
+    raise AssertionError("export did not finish")
+
+
+def test_same_history_and_case_export_separately(app_env):
+    seed = CaseStore(app_env)
+    for user_id in ("alice", "bob"):
+        seed.add_case(user_id, dict(CASE, symptoms=f"{user_id}'s private history"))
+    seed.close()
+
+    alice, bob = _session("alice"), _session("bob")
+    assert not alice.exception and not bob.exception
+
+    keys = alice.session_state["export_job"], bob.session_state["export_job"]
+    assert keys[0] != keys[1]
+    files = [os.path.join(report.REPORT_DIR, f"{key}.pdf") for key in keys]
+    assert all(os.path.exists(path) for path in files)
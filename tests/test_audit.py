@@ -0,0 +1,58 @@
+import json
+import threading
+import warnings
+
+import pytest
+
+import audit
+
+
+def test_events_are_written(tmp_path):
+    path = str(tmp_path / "audit.jsonl")
+    log = audit.AuditLog(path, fsync="never")
+    log.record({"ts": 0, "event": "analyze", "session": "s"})
+    log.close()
+    with open(path) as f:
+        assert [json.loads(line)["event"] for line in f] == ["analyze"]
+
+
+def test_failed_write_warns(tmp_path):
+    log = audit.AuditLog(str(tmp_path / "missing" / "audit.jsonl"), fsync_interval=0.01)
+    try:
+        with pytest.warns(UserWarning, match="Audit log write failed"):
+            log._write_retrying([{"ts": 0, "event": "analyze"}])
+    finally:
+        log.close()
+
+
+def test_records_racing_close_are_written(tmp_path):
+    path = str(tmp_path / "audit.jsonl")
+    log = audit.AuditLog(path, fsync="never", queue_size=10)
+    start = threading.Barrier(5)
+
+    def produce(worker):
+        start.wait()
+        for n in range(200):
+            log.record({"ts": 0, "event": "analyze", "session": f"{worker}-{n}"})
+
+    threads = [threading.Thread(target=produce, args=(w,)) for w in range(4)]
+    for t in threads:
+        t.start()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        start.wait()
+        log.close()
+        for t in threads:
+            t.join()
+    with open(path) as f:
+        assert len(f.readlines()) == 800
+
+
+def test_record_after_close_warns_and_is_written(tmp_path):
+    path = str(tmp_path / "audit.jsonl")
+    log = audit.AuditLog(path, fsync="always")
+    log.close()
+    with pytest.warns(UserWarning, match="after the log was closed"):
+        log.record({"ts": 0, "event": "followup", "session": "s"})
+    with open(path) as f:
+        assert [json.loads(line)["event"] for line in f] == ["followup"]
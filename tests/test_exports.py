@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+import exports
+
+
+@pytest.fixture
+def jobs():
+    jobs = exports.ExportJobs(workers=1)
+    yield jobs
+    jobs.shutdown()
+
+
+def _blocked(gate, calls):
+    def build(name, progress):
+        calls.append(name)
+        progress(1, 2)
+        gate.wait(5)
+        return name.encode()
+    return build
+
+
+def test_same_key_reuses_the_job(jobs):
+    gate, calls = threading.Event(), []
+    build = _blocked(gate, calls)
+    first = jobs.submit("session-a", "key", build, "report")
+    assert jobs.submit("session-b", "key", build, "report") is first
+    gate.set()
+    assert first.wait(5) == exports.DONE
+    assert jobs.submit("session-a", "key", build, "report") is first
+    assert calls == ["report"]
+    assert first.result == b"report" and first.progress == 1.0
+    assert jobs.get("key") is first
+
+
+def test_failed_job_is_retried(jobs):
+    attempts = []
+
+    def flaky(progress):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("disk full")
+        return b"pdf"
+
+    job = jobs.submit("session", "key", flaky)
+    assert job.wait(5) == exports.FAILED
+    assert job.error == "OSError: disk full" and job.result is None
+
+    retry = jobs.submit("session", "key", flaky)
+    assert retry is not job
+    assert retry.wait(5) == exports.DONE and retry.result == b"pdf"
+    assert jobs.get("key") is retry and len(attempts) == 2
+
+
+def test_newer_request_replaces_queued_job(jobs):
+    gate, calls = threading.Event(), []
+    build = _blocked(gate, calls)
+    running = jobs.submit("other", "busy", build, "busy")
+    queued = jobs.submit("session", "old", build, "old")
+    newer = jobs.submit("session", "new", build, "new")
+    gate.set()
+
+    assert running.wait(5) == exports.DONE and newer.wait(5) == exports.DONE
+    assert queued.future.cancelled() and jobs.get("old") is None
+    assert calls == ["busy", "new"]
+
+
+def test_progress_is_reported(jobs):
+    gate, calls = threading.Event(), []
+    job = jobs.submit("session", "key", _blocked(gate, calls), "report")
+    for _ in range(500):
+        if job.done_steps:
+            break
+        time.sleep(0.01)
+    assert job.state == exports.RUNNING and job.progress == 0.5
+    gate.set()
+    assert job.wait(5) == exports.DONE
+
+
+def test_finished_jobs_are_bounded():
+    jobs = exports.ExportJobs(workers=1, max_finished=2)
+    try:
+        for n in range(4):
+            assert jobs.submit("session", f"key{n}", lambda progress: b"").wait(5) == exports.DONE
+        assert [jobs.get(f"key{n}") is not None for n in range(4)] == [False, False, True, True]
+    finally:
+        jobs.shutdown()
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import rules
+
+ranker = pytest.importorskip("ranker")
+
+
+@pytest.fixture
+def model_ranker(monkeypatch):
+    monkeypatch.setattr(rules, "RANKER", "model")
+    monkeypatch.setattr(rules, "_RANKERS", {})
+    rules.RESULT_CACHE.clear()
+    yield
+    rules.RESULT_CACHE.clear()
+
+
+@pytest.fixture(scope="module")
+def trained(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("model") / "ranker.json")
+    ranker.save(ranker.train(rules.CONDITIONS), path)
+    return path
+
+
+def test_model_round_trip(trained):
+    model = ranker.load(trained)
+    assert isinstance(model.weights, np.memmap)
+    top = model.rank([rules.tokenize("fever and headache")[1]], rules._KB)[0]
+    assert rules.CONDITIONS[top[0]]["id"] == "viral"
+
+
+def test_model_weights_are_not_unpickled(trained, tmp_path):
+    path = str(tmp_path / "ranker.json")
+    with open(trained) as src, open(path, "w") as dst:
+        dst.write(src.read())
+    np.save(ranker.weights_path(path), np.array([{"not": "data"}], dtype=object), allow_pickle=True)
+    with pytest.raises(ValueError):
+        ranker.load(path)
+
+
+@pytest.mark.parametrize("content", ["garbage text", '{"format": 2}'])
+def test_broken_model_falls_back_to_rules(model_ranker, monkeypatch, tmp_path, content):
+    path = tmp_path / "ranker.json"
+    path.write_text(content)
+    monkeypatch.setattr(rules, "RANKER_MODEL", str(path))
+    with pytest.warns(UserWarning, match="Model ranker unavailable"):
+        result = rules.analyze_symptoms("fever and headache")
+    assert result["condition_id"] == "viral"
+    assert rules._RANKERS[str(path)] is None
+
+
+class _AlwaysHeart:
+    def rank(self, token_lists, kb, k=3):
+        return [[kb["positions"]["heart"]] for _ in token_lists]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("chest", None),
+    ("heart", None),
+    ("chest pain", "heart"),
+])
+def test_model_high_severity_needs_an_exact_keyword(model_ranker, monkeypatch, text, expected):
+    monkeypatch.setattr(rules, "get_ranker", lambda: _AlwaysHeart())
+    assert rules.analyze_symptoms(text)["condition_id"] == expected
+    assert rules.analyze_symptoms_batch([text])[0]["condition_id"] == expected
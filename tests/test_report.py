@@ -0,0 +1,111 @@
+import io
+import re
+import zlib
+
+import pytest
+
+import report
+
+
+def _case(n):
+    return {"symptoms": f"symptoms {n}", "condition": "Common Cold", "severity": "Low",
+            "advice": "Rest.", "time": "2024-01-01 10:00"}
+
+
+def _chunks(count):
+    cases = [_case(n) for n in range(1, count + 1)]
+    return [cases[i:i + report.CHUNK_CASES] for i in range(0, count, report.CHUNK_CASES)]
+
+
+def _stream(count, **kwargs):
+    chunks = _chunks(count)
+    current = {"symptoms": "chest pain", "result": {"condition": "Heart", "severity": "High", "advice": "Go."}}
+    return b"".join(report.stream_pdf_report(chunks, current, total_chunks=count // report.CHUNK_CASES, **kwargs))
+
+
+def _pages(data):
+    """Check the PDF structure; the decompressed content of each page, in order."""
+    assert data.startswith(b"%PDF-1.3\n") and data.endswith(b"%%EOF\n")
+
+    xref = int(re.search(rb"startxref\n(\d+)\n", data).group(1))
+    assert data[xref:].startswith(b"xref\n")
+    size = int(re.search(rb"/Size (\d+)", data).group(1))
+    offsets = [int(o) for o in re.findall(rb"(\d{10}) 00000 n ", data[xref:])]
+    assert len(offsets) == size - 1
+    for num, offset in enumerate(offsets, 1):
+        assert data[offset:].startswith(b"%d 0 obj\n" % num)
+
+    kids = [int(k) for k in re.findall(rb"(\d+) 0 R", re.search(rb"/Kids \[([^\]]*)\]", data).group(1))]
+    assert int(re.search(rb"/Type /Pages /Kids \[[^\]]*\] /Count (\d+)", data).group(1)) == len(kids)
+
+    pages = []
+    for kid in kids:
+        page = data[offsets[kid - 1]:]
+        content = int(re.match(rb"\d+ 0 obj\n<</Type /Page .*?/Contents (\d+) 0 R>>", page).group(1))
+        obj = data[offsets[content - 1]:]
+        length = int(re.match(rb"\d+ 0 obj\n<</Filter /FlateDecode /Length (\d+)>>\nstream\n", obj).group(1))
+        start = obj.index(b"stream\n") + len(b"stream\n")
+        pages.append(zlib.decompress(obj[start:start + length]))
+    return pages
+
+
+def _case_numbers(pages):
+    return [int(n) for page in pages for n in re.findall(rb"\(Case (\d+)\)", page)]
+
+
+@pytest.mark.parametrize("count", [0, 1, report.CHUNK_CASES, 2 * report.CHUNK_CASES + 37])
+def test_streamed_report_has_every_case_in_order(count):
+    pages = _pages(_stream(count))
+    assert _case_numbers(pages) == list(range(1, count + 1))
+    assert b"MediBotX Health Report" in pages[0]
+    assert b"Current Case:" in pages[-1]
+    if count == 0:
+        assert any(b"No previous cases." in page for page in pages)
+
+
+def test_streamed_report_page_count():
+    count = 2 * report.CHUNK_CASES + 37
+    chunks = _chunks(count)
+    expected = len(report._render_pages(report._draw_title))
+    expected += sum(len(report._render_pages(report._draw_cases, 1 + i * report.CHUNK_CASES, c))
+                    for i, c in enumerate(chunks[:-1]))
+    expected += len(report._render_pages(report._draw_tail, 1 + 2 * report.CHUNK_CASES, chunks[-1], None))
+    assert len(_pages(_stream(count))) == expected
+    # a chunk of 100 cases does not fit on one page
+    assert expected > 2 + len(chunks)
+
+
+def test_streamed_report_reuses_cached_pages(tmp_path, monkeypatch):
+    cache = report.PageCache(str(tmp_path / "pages"))
+    count = 2 * report.CHUNK_CASES + 5
+    first = _pages(_stream(count, cache=cache))
+    assert len(list((tmp_path / "pages").iterdir())) == 2
+
+    calls = []
+    original = report._render_pages
+    monkeypatch.setattr(report, "_render_pages", lambda draw, *args: calls.append(draw) or original(draw, *args))
+    second = _pages(_stream(count, cache=cache))
+    assert report._draw_cases not in calls
+    assert second[1:] == first[1:]
+
+
+def test_streamed_report_progress():
+    seen = []
+    _stream(2 * report.CHUNK_CASES + 5, progress=lambda done, total: seen.append((done, total)))
+    assert seen == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_write_pdf_report(tmp_path):
+    path = str(tmp_path / "report.pdf")
+    report.write_pdf_report(path, _chunks(150), None)
+    with open(path, "rb") as f:
+        assert _case_numbers(_pages(f.read())) == list(range(1, 151))
+    assert [p.name for p in tmp_path.iterdir()] == ["report.pdf"]
+
+
+def test_streamed_report_opens_in_a_pdf_reader():
+    pypdf = pytest.importorskip("pypdf")
+    data = _stream(report.CHUNK_CASES + 20)
+    reader = pypdf.PdfReader(io.BytesIO(data))
+    assert len(reader.pages) == len(_pages(data))
+    assert "Case 120" in "".join(page.extract_text() for page in reader.pages)
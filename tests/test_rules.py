@@ -0,0 +1,443 @@
+import copy
+import json
+import hashlib
+import os
+import pickle
+import random
+
+import pytest
+
+import rules
+
+
+def _vocabulary():
+    words = {w for item in rules.CONDITIONS for k in item["keywords"] for w in k.lower().split()}
+    # near-misses for word boundaries and substring phrases
+    return sorted(words | {"and", "painful", "fitness", "ear!", "can't", "year", "headaches"})
+
+
+def _texts(count=500, seed=0):
+    rnd = random.Random(seed)
+    vocab = _vocabulary()
+    texts = [item["keywords"][0] for item in rules.CONDITIONS] + ["", "   "]
+    texts += [" ".join(rnd.choice(vocab) for _ in range(rnd.randint(0, 12))) for _ in range(count)]
+    return texts
+
+
+@pytest.fixture(scope="module")
+def automaton():
+    return rules.KeywordAutomaton(rules.CONDITIONS)
+
+
+# -------------------------
+# Automaton parity with keyword_match_score
+# -------------------------
+@pytest.mark.parametrize("text", _texts())
+def test_automaton_scores_match_keyword_match_score(automaton, text):
+    text = rules.preprocess(text)
+
+    expected = {}
+    for idx, item in enumerate(rules.CONDITIONS):
+        score = rules.keyword_match_score(text, item["keywords"])
+        if score:
+            expected[idx] = score
+    assert automaton.scores(text) == expected
+
+
+# -------------------------
+# Top-k ranking
+# -------------------------
+def _full_sort(automaton, matched, k, fuzzy=(), fuzzy_weight=1.0, needs_exact=()):
+    scores = {}
+    for idx, terms in enumerate(automaton.cond_terms):
+        exact = sum(w for p, w in terms if p in matched and p not in fuzzy)
+        score = exact + sum(w * fuzzy_weight for p, w in terms if p in fuzzy)
+        if score and (exact or idx not in needs_exact):
+            scores[idx] = score
+    return sorted(scores, key=lambda idx: (-scores[idx], idx))[:k]
+
+
+@pytest.mark.parametrize("k", [1, 3, 5])
+def test_rank_matches_full_sort(automaton, k):
+    for text in _texts(200, seed=2):
+        matched = automaton.scan(rules.preprocess(text))
+        assert automaton.rank(matched, k) == _full_sort(automaton, matched, k)
+
+
+def test_rank_matches_full_sort_with_fuzzy_ids(automaton):
+    rnd = random.Random(3)
+    needs_exact = {0, 2}
+    for text in _texts(200, seed=3):
+        matched = automaton.scan(rules.preprocess(text))
+        fuzzy = {pid for pid in matched if rnd.random() < 0.5}
+        expected = _full_sort(automaton, matched, 3, fuzzy, 0.5, needs_exact)
+        assert automaton.rank(matched, 3, fuzzy, 0.5, needs_exact) == expected
+
+
+def test_rank_breaks_ties_in_kb_order():
+    conditions = [
+        {"keywords": ["ache"]},
+        {"keywords": ["sore throat", "cough"]},
+        {"keywords": ["cough", "ache"]},
+        {"keywords": ["sore throat"]},
+        {"keywords": ["cough"]},
+        {"keywords": ["ache"]},
+    ]
+    automaton = rules.KeywordAutomaton(conditions)
+    for text in ["ache", "cough", "sore throat", "cough ache", "sore throat cough ache"]:
+        matched = automaton.scan(text)
+        for k in range(1, len(conditions) + 1):
+            assert automaton.rank(matched, k) == _full_sort(automaton, matched, k)
+    assert automaton.rank(automaton.scan("ache"), 2) == [0, 2]
+    assert automaton.rank(automaton.scan("sore throat cough ache"), 3) == [1, 2, 3]
+
+
+# -------------------------
+# Batch API
+# -------------------------
+_EVERYDAY = [
+    "my tummy hurts and I vomited", "can't breathe, chestpain", "headaches and feverish",
+    "seizurs and fever", "vomitting diarrhoea", "I feel fit", "fits", "our office is cramped",
+]
+
+
+def test_batch_matches_single_results():
+    texts = _texts(300, seed=1) + _EVERYDAY
+    assert rules.analyze_symptoms_batch(texts) == [rules.analyze_symptoms(t) for t in texts]
+
+
+def test_batch_handles_empty_and_repeated_texts():
+    assert rules.analyze_symptoms_batch([]) == []
+    results = rules.analyze_symptoms_batch(["chest pain", "", "chest pain"])
+    assert results[0] == results[2] == rules.analyze_symptoms("chest pain")
+    assert results[1] == rules.analyze_symptoms("")
+
+
+# -------------------------
+# Incremental analysis
+# -------------------------
+def _edits(text, rnd):
+    """Typing text, then random inserts, deletions and pastes, then backspacing it all."""
+    for i in range(1, len(text) + 1):
+        yield text[:i]
+    for _ in range(5):
+        pos = rnd.randrange(len(text) + 1)
+        op = rnd.random()
+        if op < 0.4:
+            text = text[:pos] + rnd.choice("abc 'ep") + text[pos:]
+        elif op < 0.7:
+            text = text[:pos] + text[pos + 3:]
+        else:
+            text = text[:pos] + " " + rnd.choice(_EVERYDAY) + " " + text[pos:]
+        yield text
+    while text:
+        text = text[:-1]
+        yield text
+
+
+def test_incremental_matches_full_analysis_after_edits():
+    rnd = random.Random(4)
+    analyzer = rules.IncrementalAnalyzer()
+    for text in _texts(60, seed=4)[-60:] + _EVERYDAY:
+        analyzer.reset()
+        for edited in _edits(text, rnd):
+            assert analyzer.update(edited) == rules.analyze_symptoms(edited), edited
+
+
+def test_incremental_follows_kb_reload():
+    original = rules.CONDITIONS
+    edited = copy.deepcopy(original)
+    next(item for item in edited if item["id"] == "heart")["advice"] = "Edited advice."
+
+    analyzer = rules.IncrementalAnalyzer()
+    analyzer.update("chest pain")
+    try:
+        rules.load_conditions(edited)
+        assert analyzer.update("chest pain and") == rules.analyze_symptoms("chest pain and")
+        assert analyzer.result["advice"] == "Edited advice."
+    finally:
+        rules.load_conditions(original)
+
+
+# -------------------------
+# Result cache
+# -------------------------
+def test_result_cache_evicts_least_recently_used():
+    cache = rules.ResultCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["size"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+
+    cache.resize(1)
+    assert cache.stats()["size"] == 1 and cache.get("c") == 3
+    cache.resize(0)
+    cache.put("d", 4)
+    assert cache.get("d") is None and cache.stats()["size"] == 0
+
+
+def test_result_cache_is_invalidated_on_reload():
+    original = rules.CONDITIONS
+    edited = copy.deepcopy(original)
+    next(item for item in edited if item["id"] == "heart")["advice"] = "Edited advice."
+
+    before = rules.analyze_symptoms("chest pain")
+    assert rules.analyze_symptoms("chest pain") == before
+    assert rules.RESULT_CACHE.stats()["size"] > 0
+    try:
+        rules.load_conditions(edited)
+        assert rules.RESULT_CACHE.stats()["size"] == 0
+        assert rules.analyze_symptoms("chest pain")["advice"] == "Edited advice."
+    finally:
+        rules.load_conditions(original)
+    assert rules.analyze_symptoms("chest pain") == before
+
+
+def test_cached_results_are_copies():
+    rules.analyze_symptoms("chest pain")["advice"] = "changed by a caller"
+    assert rules.analyze_symptoms("chest pain")["advice"] != "changed by a caller"
+
+
+# -------------------------
+# Compiled artifacts
+# -------------------------
+def test_artifact_round_trip(tmp_path):
+    path = str(tmp_path / "conditions.kb")
+    rules.compile_knowledge_base(rules.CONDITIONS, path, source="rules.py")
+    compiled = rules.read_artifact(path)
+    assert compiled["conditions"] == rules.CONDITIONS
+    assert compiled["source_hash"] == rules.conditions_hash(rules.CONDITIONS)
+
+
+def test_artifact_refuses_code(tmp_path):
+    path = str(tmp_path / "evil.kb")
+    payload = pickle.dumps(os.system)
+    header = rules._ARTIFACT_HEADER.pack(
+        rules._ARTIFACT_MAGIC, rules.ARTIFACT_FORMAT, len(payload), hashlib.sha256(payload).digest()
+    )
+    with open(path, "wb") as f:
+        f.write(header + payload)
+    with pytest.raises(pickle.UnpicklingError):
+        rules.read_artifact(path)
+
+
+def test_stale_builtin_artifact_is_ignored(tmp_path, monkeypatch):
+    path = str(tmp_path / "conditions.kb")
+    edited = copy.deepcopy(rules.CONDITIONS)
+    edited[0]["advice"] = "Edited advice."
+    rules.compile_knowledge_base(rules.CONDITIONS, path, source="rules.py")
+
+    monkeypatch.setattr(rules, "KB_ARTIFACT", path)
+    monkeypatch.setattr(rules, "CONDITIONS", edited)
+    monkeypatch.setattr(rules, "_BUILTIN_CONDITIONS", edited)
+    with pytest.warns(UserWarning, match="changed since it was compiled"):
+        kb = rules._initial_kb()
+    assert kb["conditions"][0]["advice"] == "Edited advice."
+
+
+# -------------------------
+# Follow-up decision tables
+# -------------------------
+def test_builtin_conditions_validate():
+    rules.validate_conditions(rules.CONDITIONS)
+
+
+def test_invalid_decision_table_is_rejected():
+    edited = copy.deepcopy(rules.CONDITIONS)
+    heart = next(item for item in edited if item["id"] == "heart")
+    heart["decision_table"]["rules"][0]["any_answer"] = ["no_such_question"]
+    with pytest.raises(ValueError, match="no_such_question"):
+        rules.validate_conditions(edited)
+
+
+@pytest.mark.parametrize("answer", ["Yes", "No", "Not sure"])
+def test_heart_followup_any_answer_is_high(answer):
+    final = rules.evaluate_followup("heart", {"severe_lasting": answer, "risk_signs": "No"})
+    assert final["final_severity"] == "High"
+
+
+def test_heart_followup_without_answers_is_medium():
+    assert rules.evaluate_followup("heart", {})["final_severity"] == "Medium"
+
+
+# -------------------------
+# Reloads and metrics
+# -------------------------
+def test_identical_reload_keeps_version():
+    version = rules.kb_version()
+    assert rules.load_conditions(copy.deepcopy(rules.CONDITIONS)) == version
+    assert rules.kb_version() == version
+
+
+def test_followup_metric_label_is_bounded():
+    rules.evaluate_followup("no-such-condition-1234", {})
+    rendered = rules.metrics.get_collector().render()
+    assert "no-such-condition-1234" not in rendered
+    assert 'condition="other"' in rendered
+
+
+# -------------------------
+# Typo tolerance
+# -------------------------
+@pytest.mark.parametrize("text, wrong", [
+    ("my fists hurt", "seizure"),
+    ("heartache", "ear"),
+    ("I heard a ringing noise", "heart"),
+])
+def test_ordinary_words_are_not_corrected_into_keywords(text, wrong):
+    result = rules.analyze_symptoms(text)
+    assert result["condition_id"] != wrong
+    assert result["severity"] != "High"
+
+
+def _all_paths(text):
+    return (rules.analyze_symptoms(text), rules.analyze_symptoms_batch([text])[0],
+            rules.IncrementalAnalyzer().update(text))
+
+
+def test_typo_alone_does_not_select_high_severity():
+    # "seizurs" only reaches the seizure keywords through correction
+    text = "seizurs and fever"
+    _, fuzzy = rules.match_keywords(rules._KB, *rules.tokenize(text)[:2])
+    assert fuzzy
+    for result in _all_paths(text):
+        assert result["severity"] != "High"
+
+
+def test_typo_alone_gives_no_result():
+    for result in _all_paths("seizurs"):
+        assert result["condition_id"] is None
+
+
+def test_phrase_written_as_one_word_is_an_exact_match():
+    text = "chestpain"
+    matched, fuzzy = rules.match_keywords(rules._KB, *rules.tokenize(text)[:2])
+    assert matched and not fuzzy
+    assert rules.analyze_symptoms(text)["condition_id"] == "heart"
+
+
+def test_runtime_fuzzy_distance_caps_compiled_index(monkeypatch):
+    index = rules.build_fuzzy_index(rules.CONDITIONS, max_distance=2)
+    assert rules.closest_term("vomitting", index) == "vomiting"
+    monkeypatch.setattr(rules, "FUZZY_MAX_DISTANCE", 0)
+    index["cache"].clear()
+    assert rules.closest_term("vomitting", index) is None
+
+
+# -------------------------
+# Inflections and synonyms
+# -------------------------
+@pytest.mark.parametrize("text, expected", [
+    ("I keep throwing up", "food_poisoning"),
+    ("threw up twice", "food_poisoning"),
+    ("throwing a ball", None),
+])
+def test_throwing_up_is_a_phrase(text, expected):
+    assert rules.analyze_symptoms(text)["condition_id"] == expected
+
+
+@pytest.mark.parametrize("text", [
+    "I was visiting my grandmother",
+    "it was a cheat day",
+    "the sun will shine tomorrow",
+    "the roses bloom in spring",
+])
+def test_ordinary_sentences_are_not_triaged(text):
+    for result in _all_paths(text):
+        assert result["condition_id"] is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("I vomited twice", "food_poisoning"),
+    ("my legs hurt", "leg_pain"),
+    ("stomach cramping", "stomach"),
+    ("I feel fatigued", "viral"),
+])
+def test_inflections_match(text, expected):
+    assert rules.analyze_symptoms(text)["condition_id"] == expected
+
+
+@pytest.mark.parametrize("form", [
+    "cramped", "armed", "backed", "backing", "legging", "legged",
+    "severed", "lots", "eared", "hearted",
+])
+def test_forms_that_change_meaning_are_not_mapped(form):
+    assert form not in rules._KB["lemma_index"]["table"]
+
+
+@pytest.mark.parametrize("text", [
+    "our office is cramped",
+    "the guards were armed",
+    "she backed the car out",
+    "he wore leggings and a jacket",
+    "a severed cable",
+    "lots of homework",
+    "a kind hearted nurse",
+])
+def test_ordinary_inflections_are_not_triaged(text):
+    for result in _all_paths(text):
+        assert result["condition_id"] is None
+
+
+# -------------------------
+# Bulk triage
+# -------------------------
+def _triage(tmp_path, name, content, *extra):
+    src = tmp_path / name
+    src.write_text(content, encoding="utf-8")
+    out = tmp_path / "out.jsonl"
+    code = rules.main(["triage", str(src), "-o", str(out), "--workers", "1", *extra])
+    lines = out.read_text(encoding="utf-8").splitlines() if out.exists() else []
+    return code, [json.loads(line) for line in lines]
+
+
+def test_triage_csv(tmp_path):
+    code, rows = _triage(tmp_path, "in.csv", "id,symptoms\n1,chest pain\n2,ear pain\n")
+    assert code == 0
+    assert [r["condition_id"] for r in rows] == ["heart", "ear"]
+
+
+def test_triage_missing_column_is_an_error(tmp_path, capsys):
+    code, rows = _triage(tmp_path, "in.csv", "id,Symptoms\n1,chest pain\n")
+    assert code == 1 and rows == []
+    assert "'symptoms' column" in capsys.readouterr().err
+
+
+def test_triage_missing_field_in_first_record_is_an_error(tmp_path, capsys):
+    code, rows = _triage(tmp_path, "in.jsonl", '{"text": "chest pain"}\n')
+    assert code == 1 and rows == []
+    assert "line 1: no 'symptoms' field" in capsys.readouterr().err
+
+
+def test_triage_skips_and_reports_bad_records(tmp_path, capsys):
+    content = "\n".join([
+        '{"symptoms": "chest pain"}',
+        '{"symptoms": 5}',
+        '["a"]',
+        '{"symptoms": "ear pain"',
+        '{"other": 1}',
+        '{"symptoms": "ear pain"}',
+    ]) + "\n"
+    code, rows = _triage(tmp_path, "in.jsonl", content)
+    err = capsys.readouterr().err
+    assert code == 1
+    assert [r["symptoms"] for r in rows] == ["chest pain", "ear pain"]
+    for where in ("line 2:", "line 3:", "line 4:", "line 5:"):
+        assert where in err
+    assert "line 1:" not in err and "line 6:" not in err
+    assert "4 records skipped" in err
+
+
+def test_triage_reads_json_arrays(tmp_path, capsys):
+    content = json.dumps([{"symptoms": "chest pain"}, {"symptoms": None}, {"symptoms": "ear pain"}])
+    code, rows = _triage(tmp_path, "in.json", content)
+    assert code == 1
+    assert [r["condition_id"] for r in rows] == ["heart", "ear"]
+    assert "item 2:" in capsys.readouterr().err
+
+    code, rows = _triage(tmp_path, "in.json", '{"symptoms": "chest pain"}')
+    assert code == 1 and rows == []
@@ -0,0 +1,15 @@
+import rules
+import service
+
+
+def test_batch_reports_the_server_version_for_the_same_content():
+    kb = rules._KB
+    version, results = service._score_batch(["chest pain"], kb["source_hash"], kb["version"] + 5)
+    assert version == kb["version"] + 5
+    assert results == [rules.analyze_symptoms("chest pain")]
+
+
+def test_batch_scored_with_other_content_has_no_version():
+    version, results = service._score_batch(["chest pain"], "other content", rules.kb_version())
+    assert version is None
+    assert results[0]["condition_id"] == "heart"
@@ -0,0 +1,50 @@
+import pytest
+
+from storage import CaseStore
+
+
+def _case(n):
+    return {"symptoms": f"case {n}", "condition": "c", "condition_id": "c",
+            "severity": "Low", "advice": "a", "time": "t"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    # a long interval so only batch_size and explicit flushes write
+    store = CaseStore(str(tmp_path / "cases.db"), batch_size=4, flush_interval=3600)
+    yield store
+    store.close()
+
+
+def test_reads_include_buffered_cases_without_flushing(store):
+    for n in range(10):
+        store.add_case("a", _case(n))
+    store.add_case("b", _case(99))
+    assert store._pending  # cases 8, 9 and b's are still buffered
+
+    assert store.count("a") == 10
+    pages = [store.page("a", p, 3) for p in range(4)]
+    assert [c["symptoms"] for page in pages for c in page] == [f"case {n}" for n in range(9, -1, -1)]
+    assert [c["number"] for page in pages for c in page] == list(range(10, 0, -1))
+    assert store._pending
+
+    store.flush()
+    assert [store.page("a", p, 3) for p in range(4)] == pages
+
+
+def test_version_changes_with_history_not_with_flush(store):
+    store.add_case("a", _case(0))
+    before = store.version("a")
+    store.flush()
+    assert store.version("a") == before
+
+    store.clear("a")
+    store.add_case("a", _case(1))
+    assert store.version("a") != before
+
+
+def test_exports_see_buffered_cases(store):
+    for n in range(3):
+        store.add_case("a", _case(n))
+    assert [c["symptoms"] for c in store.all("a")] == ["case 0", "case 1", "case 2"]
+    assert [c["symptoms"] for chunk in store.iter_cases("a", 2) for c in chunk] == ["case 0", "case 1", "case 2"]